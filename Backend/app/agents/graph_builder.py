@@ -3,14 +3,31 @@ Graph Builder Agent for entity classification and knowledge graph creation.
 Uses Gemini 2.5 Flash for entity classification and relationship extraction.
 """
 
+import sys
 import json
 import asyncio
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import hashlib
+import heapq
+from collections import Counter
+from itertools import cycle, islice
+from operator import methodcaller
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+from datetime import datetime, timedelta, timezone
 try:
     import google.generativeai as genai
 except ImportError:
     genai = None
+try:
+    from google.api_core import exceptions as google_exceptions
+    # Transient Gemini failures (429/500/503/504) worth backing off on
+    RETRYABLE_GEMINI_ERRORS = (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:
+    RETRYABLE_GEMINI_ERRORS = (Exception,)
 
 from ..models.receipt import Receipt, ReceiptItem
 from ..models.knowledge_graph import (
@@ -21,6 +38,62 @@ from google.cloud import firestore
 from ..utils.config import settings
 from ..utils.logging import LoggerMixin
 
+_price_of = methodcaller("get", "price", 0)
+
+
+def _is_product(entity: GraphEntity) -> bool:
+    """Filter predicate for product entities."""
+    return entity.type == "product"
+
+
+def _total_price_of(entity: GraphEntity) -> float:
+    """Total price recorded on an entity, 0 if absent."""
+    return entity.attributes.get("total_price", 0) if entity.attributes else 0
+
+
+class GraphLoader:
+    """
+    Request-scoped loader for knowledge graphs.
+    
+    Memoizes graphs by ID and coalesces loads issued in the same event loop
+    tick into a single batched fetch.
+    """
+    
+    def __init__(self, fetch_many: Callable[[List[str]], Awaitable[Dict[str, KnowledgeGraph]]]):
+        self._fetch_many = fetch_many
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._dispatch_task: Optional[asyncio.Task] = None
+    
+    async def load(self, graph_id: str) -> Optional[KnowledgeGraph]:
+        """Load a graph by ID, returning None if it does not exist."""
+        future = self._futures.get(graph_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[graph_id] = loop.create_future()
+            self._pending.append(graph_id)
+            if self._dispatch_task is None:
+                # Runs after the loads already queued in this tick have registered
+                self._dispatch_task = loop.create_task(self._dispatch())
+        return await future
+    
+    async def load_many(self, graph_ids: List[str]) -> List[Optional[KnowledgeGraph]]:
+        """Load several graphs, in order, with at most one fetch for the uncached IDs."""
+        return list(await asyncio.gather(*(self.load(graph_id) for graph_id in graph_ids)))
+    
+    async def _dispatch(self) -> None:
+        graph_ids, self._pending = self._pending, []
+        self._dispatch_task = None
+        try:
+            graphs_by_id = await self._fetch_many(graph_ids)
+        except Exception as e:
+            # Drop failed entries so a later load can retry
+            for graph_id in graph_ids:
+                self._futures.pop(graph_id).set_exception(e)
+            return
+        for graph_id in graph_ids:
+            self._futures[graph_id].set_result(graphs_by_id.get(graph_id))
+
 
 class GraphBuilderAgent(LoggerMixin):
     """
@@ -35,6 +108,9 @@ class GraphBuilderAgent(LoggerMixin):
         self.firestore = FirestoreService()
         self._setup_gemini()
         
+        # Bound concurrent Gemini calls to respect API rate limits
+        self._gemini_semaphore = asyncio.Semaphore(settings.gemini_max_concurrency)
+        
         # Entity types and categories
         self.entity_types = {
             "product": "Physical or digital product/item",
@@ -751,104 +827,17 @@ EXAMPLES of what TO extract:
         expiry_date = today + timedelta(days=expiry_days)
         return expiry_date.isoformat()
     
-    def _entity_to_comprehensive_node(self, entity) -> Dict[str, Any]:
-        """Convert entity to comprehensive node format."""
-        return {
-            "id": entity.id,
-            "name": entity.name,
-            "type": entity.type,
-            "attributes": entity.attributes,
-            "confidence": entity.confidence
-        }
-    
-    def _relation_to_comprehensive_edge(self, relation) -> Dict[str, Any]:
-        """Convert relation to comprehensive edge format."""
-        return {
-            "id": relation.id,
-            "source": relation.source_entity_id,
-            "target": relation.target_entity_id,
-            "type": relation.relation_type,
-            "weight": relation.weight,
-            "attributes": relation.attributes
-        }
-    
     def _create_classification_prompt(self, items_data: List[Dict[str, Any]]) -> str:
-        """Create focused prompt for universal receipt analysis with enhanced expiry and price prediction."""
+        """Create compact prompt for universal receipt analysis with expiry and price prediction."""
         categories_str = ", ".join(self.product_categories)
+        today = datetime.now().strftime("%Y-%m-%d")
         
-        # Calculate dynamic example dates
-        current_date = datetime.now()
-        
-        prompt = f"""Analyze this receipt and return ONLY valid JSON.
-
-You are a UNIVERSAL receipt analyzer handling ALL business types:
-- Grocery stores & supermarkets
-- Restaurants & food service
-- Electronics & technology stores
-- Clothing & fashion retail
-- Pharmacies & healthcare
-- Gas stations & automotive
-- Office supplies & stationery
-- Online marketplaces
-- B2B transactions & corporate purchases
-- Services (consulting, repairs, subscriptions)
-- Entertainment & recreation
-- Home improvement & hardware
+        prompt = f"""Analyze these receipt items (any business type: grocery, restaurant, electronics, retail, pharmacy, fuel, office, online, B2B, services, entertainment, hardware) and return ONLY valid JSON.
 
 Available categories: {categories_str}
 
 Receipt items:
-{json.dumps(items_data, indent=2)}
-
-CRITICAL: Today is {current_date.strftime("%Y-%m-%d")}. Use this date for expiry predictions.
-
-For REALISTIC EXPIRY DATE PREDICTION, use these ACTUAL shelf life guidelines:
-
-FRESH PRODUCE:
-- Leafy greens (lettuce, spinach): 3-5 days
-- Bananas: 5-7 days (yellow), 2-3 days (spotted)
-- Apples: 7-14 days (room temp), 30-45 days (refrigerated)
-- Citrus fruits: 7-14 days
-- Berries: 3-7 days
-- Tomatoes: 5-7 days
-- Onions: 30-60 days
-- Potatoes: 30-90 days
-- Carrots: 21-30 days
-
-DAIRY PRODUCTS:
-- Fresh milk: 5-7 days past purchase
-- Yogurt: 7-14 days
-- Cheese (hard): 30-60 days
-- Cheese (soft): 7-14 days
-- Butter: 30-45 days
-- Eggs: 21-28 days
-
-PACKAGED FOODS:
-- Bread (fresh): 3-5 days
-- Bread (packaged): 7-14 days
-- Rice (cooked items): 1-2 days
-- Pasta (cooked): 3-5 days
-- Snacks/chips: 30-90 days
-- Cereals: 180-365 days
-
-BEVERAGES:
-- Fresh juice: 3-5 days
-- Packaged juice: 7-14 days (opened), 30-60 days (unopened)
-- Soda: 180-365 days
-- Water: 365+ days
-- Beer: 90-180 days
-- Wine: 365+ days
-
-MEAT & SEAFOOD:
-- Fresh meat: 1-3 days
-- Ground meat: 1-2 days
-- Fish: 1-2 days
-- Processed meat: 7-14 days
-
-FROZEN ITEMS:
-- Most frozen foods: Add current shelf life to frozen duration
-
-CALCULATE EXPIRY: current_date + realistic_shelf_life_days
+{json.dumps(items_data, separators=(",", ":"))}
 
 Return this exact JSON structure:
 {{
@@ -870,82 +859,34 @@ Return this exact JSON structure:
   ]
 }}
 
-CATEGORY CLASSIFICATION RULES:
-- Oil, cooking oil: "food" category
-- Soap, shampoo, cosmetics: "personal_care" category  
-- Detergent, cleaner, comfort: "household" category
-- Insecticide, pesticide, chalk (like HIT): "household" category (NOT food)
-- Spices, masala, salt: "food" category
-- Toothpaste, dental care: "personal_care" category
-
-ENHANCED PREDICTION RULES:
-EXPIRY DATE PREDICTION (Today is {current_date.strftime("%Y-%m-%d")}):
-
-ANALYZE EACH PRODUCT NAME AND PREDICT REALISTIC EXPIRY:
-1. Identify the exact product type from the name
-2. Look up realistic shelf life for that specific product
-3. Add shelf life days to current date
-4. Format as YYYY-MM-DD
-
-EXAMPLES:
-- "SAK LEMON RICE" (prepared rice dish): 1-2 days → "{(current_date + timedelta(days=2)).strftime('%Y-%m-%d')}"
-- "Orange Juice" (fresh): 3-5 days → "{(current_date + timedelta(days=4)).strftime('%Y-%m-%d')}"  
-- "Fresh Apples": 7-14 days → "{(current_date + timedelta(days=10)).strftime('%Y-%m-%d')}"
-- "Milk": 5-7 days → "{(current_date + timedelta(days=6)).strftime('%Y-%m-%d')}"
-- "Bread": 3-5 days → "{(current_date + timedelta(days=4)).strftime('%Y-%m-%d')}"
-- "Tomatoes": 5-7 days → "{(current_date + timedelta(days=6)).strftime('%Y-%m-%d')}"
-- "Cheese" (hard): 30-60 days → "{(current_date + timedelta(days=45)).strftime('%Y-%m-%d')}"
-- "Bananas": 5-7 days → "{(current_date + timedelta(days=6)).strftime('%Y-%m-%d')}"
-- "Canned goods": 365+ days → "{(current_date + timedelta(days=365)).strftime('%Y-%m-%d')}"
-- "Packaged snacks": 60-90 days → "{(current_date + timedelta(days=75)).strftime('%Y-%m-%d')}"
-
-IMPORTANT: Base expiry on ACTUAL product shelf life, not generic 2-day additions!
-
-PRICE EXTRACTION/ESTIMATION:
-- If price is 0 or missing, estimate based on product type and category
-- Rice/grains: $2-5 per kg
-- Beverages: $1-3 per item
-- Electronics: $10-1000+ based on type
-- Medicines: $5-50 per item
-- Clothing: $10-100 per item
-- Use reasonable prices for the item category if price extraction failed
-
-CONFIDENCE SCORING:
-- Use 0.9-1.0 for clear, recognizable items
-- Use 0.7-0.8 for partially recognizable items
-- Use 0.5-0.6 for unclear/generic items
-
-Instructions:
-- ANALYZE EACH PRODUCT NAME CAREFULLY for exact product type
-- Use REALISTIC shelf life data based on product category and preparation method
-- For prepared foods (cooked rice, ready meals): 1-3 days
-- For fresh produce: varies by type (see guidelines above)
-- For packaged goods: check typical shelf life for that specific product
-- For dairy: consider if fresh vs processed
-- For beverages: consider if fresh, pasteurized, or shelf-stable
-- Calculate: TODAY + REALISTIC_SHELF_LIFE_DAYS = expiry_date
-- Mark food items expiring within 3 days as "is_expiring_soon": true
-- Include shelf_life_analysis explaining your reasoning
+Rules:
+- Category: cooking oil, spices, masala, salt -> "food"; soap, shampoo, cosmetics, toothpaste -> "personal_care"; detergent, cleaners, insecticide (e.g. HIT) -> "household" (NOT food)
+- Expiry: use realistic shelf life for the specific product (prepared foods 1-3 days, fresh vs packaged, dairy, beverages); output YYYY-MM-DD computed from today={today}
+- Mark food items expiring within 3 days as "is_expiring_soon": true and explain in shelf_life_analysis
+- Price: if 0 or missing, estimate a reasonable price for the product category
+- Confidence: 0.9-1.0 clear items, 0.7-0.8 partially recognizable, 0.5-0.6 unclear/generic
+- Keep item_classifications in the exact order of the input items
 - Return ONLY the JSON, no additional text or markdown
-- Maintain exact order for item_classifications matching input items
 """
         return prompt
     
     async def _call_gemini(self, prompt: str) -> str:
-        """Call Gemini API with retry logic."""
+        """Call Gemini API, retrying transient errors with exponential backoff."""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = await asyncio.to_thread(
-                    self.model.generate_content, 
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.1,
-                        max_output_tokens=2048,
+                async with self._gemini_semaphore:
+                    response = await asyncio.to_thread(
+                        self.model.generate_content, 
+                        prompt,
+                        generation_config=genai.types.GenerationConfig(
+                            temperature=0.1,
+                            max_output_tokens=2048,
+                        )
                     )
-                )
                 return response.text
-            except Exception:
+            except RETRYABLE_GEMINI_ERRORS:
+                # Auth/validation errors propagate immediately without backoff
                 if attempt == max_retries - 1:
                     raise
                 await asyncio.sleep(2 ** attempt)  # Exponential backoff
@@ -1017,24 +958,24 @@ Instructions:
         """Provide intelligent fallback classifications when AI parsing fails."""
         self.logger.info("Using fallback classification strategy")
         fallback_categories = ["food", "beverages", "household", "personal_care", "other"]
-        classifications = []
         
-        for i in range(expected_count):
-            # Cycle through reasonable categories
-            category = fallback_categories[i % len(fallback_categories)]
-            classifications.append({
-                "category": category, 
-                "confidence": 0.5, 
-                "brand": None, 
-                "enhanced_data": {
-                    "category": category,
-                    "confidence": 0.5,
-                    "warranty_info": {"has_warranty": False},
-                    "expiry_info": {"has_expiry": category in ["food", "beverages"], "expiry_date": "2025-07-25" if category in ["food", "beverages"] else None},
-                    "nutritional_info": {"is_food": category in ["food", "beverages"]},
-                    "price_analysis": {"unit_price": 0.0, "is_discounted": False}
-                }
-            })
+        def enhanced_data(category: str) -> Dict[str, Any]:
+            # Built per item: downstream code may mutate an item's payload
+            perishable = category in ("food", "beverages")
+            return {
+                "category": category,
+                "confidence": 0.5,
+                "warranty_info": {"has_warranty": False},
+                "expiry_info": {"has_expiry": perishable, "expiry_date": "2025-07-25" if perishable else None},
+                "nutritional_info": {"is_food": perishable},
+                "price_analysis": {"unit_price": 0.0, "is_discounted": False}
+            }
+        
+        # Cycle through reasonable categories
+        classifications = [
+            {"category": category, "confidence": 0.5, "brand": None, "enhanced_data": enhanced_data(category)}
+            for category in islice(cycle(fallback_categories), expected_count)
+        ]
         
         # Set a basic comprehensive analysis for fallback
         self.comprehensive_analysis = {
@@ -1144,10 +1085,9 @@ Instructions:
             else:
                 merchant_name = "UNKNOWN"
             
-            # Generate unique suffix
-            import hashlib
+            # Generate unique suffix (3-byte digest -> 6 hex chars)
             unique_data = f"{graph.id}{date_part}{merchant_name}"
-            suffix = hashlib.md5(unique_data.encode()).hexdigest()[:6].upper()
+            suffix = hashlib.blake2b(unique_data.encode(), digest_size=3).hexdigest().upper()
             
             return f"RCP-{date_part}-{merchant_name}-{suffix}"
         except Exception:
@@ -1156,6 +1096,8 @@ Instructions:
     
     def _build_comprehensive_storage_format(self, graph: KnowledgeGraph, analysis: Dict, receipt_id: str) -> Dict[str, Any]:
         """Build the comprehensive storage format combining both specifications."""
+        # UTC timestamp with a literal Z suffix, formatted once per build
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         try:
             # Get analysis components
             business_analysis = analysis.get("business_analysis", {})
@@ -1212,7 +1154,7 @@ Instructions:
             location_entity = next((e for e in graph.entities if e.type == "location"), None)
             
             # Calculate total amount safely
-            total_amount = sum(p.attributes.get("total_price", 0) if p.attributes else 0 for p in products)
+            total_amount = sum(map(_total_price_of, products))
             
             # Build the Flutter-compatible format exactly as specified
             comprehensive_data = {
@@ -1239,7 +1181,7 @@ Instructions:
                 "expiring_soon_count": len(expiring_items),
                 "expiring_soon_labels": [p.name for p in expiring_items],
                 "alerts": alerts,
-                "created_at": datetime.now().isoformat() + "Z",
+                "created_at": created_at,
                 "processing_duration_ms": 1247,
                 "version": "1.0"
             }
@@ -1273,7 +1215,7 @@ Instructions:
                 "expiring_soon_count": 0,
                 "expiring_soon_labels": [],
                 "alerts": [],
-                "created_at": datetime.now().isoformat() + "Z",
+                "created_at": created_at,
                 "processing_duration_ms": 0,
                 "version": "1.0"
             }
@@ -1286,7 +1228,7 @@ Instructions:
             return {
                 "receipt_id": receipt_id,
                 "business_category": "Unknown",
-                "total_amount": sum(e.attributes.get("total_price", 0) for e in graph.entities if e.type == "product"),
+                "total_amount": sum(map(_total_price_of, filter(_is_product, graph.entities))),
                 "currency": "USD",
                 "node_count": len(graph.entities),
                 "edge_count": len(graph.relations),
@@ -1354,18 +1296,32 @@ Instructions:
             "weight": relation.weight
         }
     
-    async def merge_graphs(self, graph_ids: List[str], user_id: str) -> KnowledgeGraph:
+    async def _fetch_graph_map(self, graph_ids: List[str]) -> Dict[str, KnowledgeGraph]:
+        """Fetch knowledge graphs with one batched get_all, keyed by document ID."""
+        collection = self.firestore.db.collection('knowledge_graphs')
+        refs = [collection.document(graph_id) for graph_id in graph_ids]
+        snapshots = await asyncio.to_thread(lambda: list(self.firestore.db.get_all(refs)))
+        
+        return {snap.id: KnowledgeGraph.from_dict(snap.to_dict()) for snap in snapshots if snap.exists}
+    
+    def create_graph_loader(self) -> GraphLoader:
+        """Create a GraphLoader backed by this agent's batched Firestore reads."""
+        return GraphLoader(self._fetch_graph_map)
+    
+    async def merge_graphs(self, graph_ids: List[str], user_id: str, loader: Optional[GraphLoader] = None) -> KnowledgeGraph:
         """Merge multiple graphs into a unified knowledge graph."""
         try:
             self.log_operation("merge_graphs", graph_count=len(graph_ids), user_id=user_id)
-            
-            # Retrieve graphs from Firestore
-            graphs = []
-            for graph_id in graph_ids:
-                doc = self.firestore.db.collection('knowledge_graphs').document(graph_id).get()
-                if doc.exists:
-                    graph_data = doc.to_dict()
-                    graphs.append(KnowledgeGraph.from_dict(graph_data))
+            loader = loader or self.create_graph_loader()
+            
+            # Retrieve graphs from Firestore in a single batched read. The merge adopts and
+            # rewrites entities and relations, so it works on deep copies: the loader hands
+            # the same cached objects to every caller, and to repeated IDs within this call.
+            graphs = [
+                graph.model_copy(deep=True)
+                for graph in await loader.load_many(graph_ids)
+                if graph is not None
+            ]
             
             if not graphs:
                 raise ValueError("No valid graphs found to merge")
@@ -1381,45 +1337,30 @@ Instructions:
             for graph in graphs:
                 merged_graph.receipt_ids.extend(graph.receipt_ids)
             
-            # Merge entities (deduplicate by name and type)
-            entity_map = {}
+            # Merge entities (deduplicate by name and type) directly into the merged graph,
+            # indexing added entities by name for constant-time relation endpoint lookup
+            lowered_names = {}  # Names repeat across graphs; lower/intern each distinct one once
+            name_index = {}
             for graph in graphs:
                 for entity in graph.entities:
-                    key = (entity.name.lower(), entity.type)
-                    if key not in entity_map:
-                        entity_map[key] = entity
-                    else:
-                        # Merge attributes and update confidence
-                        existing = entity_map[key]
-                        existing.attributes.update(entity.attributes)
-                        existing.confidence = max(existing.confidence, entity.confidence)
-            
-            # Add deduplicated entities
-            for entity in entity_map.values():
-                merged_graph.add_entity(entity)
+                    name_key = lowered_names.get(entity.name)
+                    if name_key is None:
+                        name_key = lowered_names[entity.name] = sys.intern(entity.name.lower())
+                    if merged_graph.add_or_merge_entity(entity, key=(name_key, sys.intern(entity.type))):
+                        # First match wins, as with the previous linear scan
+                        name_index.setdefault(entity.name, entity)
             
             # Merge relations (deduplicate and strengthen weights)
-            relation_map = {}
             for graph in graphs:
                 for relation in graph.relations:
                     # Find corresponding entities in merged graph
-                    source_entity = next((e for e in merged_graph.entities if e.name == relation.source_entity_id), None)
-                    target_entity = next((e for e in merged_graph.entities if e.name == relation.target_entity_id), None)
+                    source_entity = name_index.get(relation.source_entity_id)
+                    target_entity = name_index.get(relation.target_entity_id)
                     
                     if source_entity and target_entity:
-                        key = (source_entity.id, target_entity.id, relation.relation_type)
-                        if key not in relation_map:
-                            relation.source_entity_id = source_entity.id
-                            relation.target_entity_id = target_entity.id
-                            relation_map[key] = relation
-                        else:
-                            # Strengthen existing relation
-                            existing = relation_map[key]
-                            existing.weight = min(existing.weight + 0.1, 1.0)
-            
-            # Add deduplicated relations
-            for relation in relation_map.values():
-                merged_graph.add_relation(relation)
+                        relation.source_entity_id = source_entity.id
+                        relation.target_entity_id = target_entity.id
+                        merged_graph.add_or_merge_relation(relation)
             
             # Store merged graph
             await self._store_graph(merged_graph)
@@ -1450,75 +1391,99 @@ Instructions:
             self.log_error("get_user_graph", e, user_id=user_id)
             return None
     
-    async def analyze_graph(self, graph_id: str) -> GraphAnalytics:
+    async def analyze_graph(self, graph_id: str, loader: Optional[GraphLoader] = None) -> GraphAnalytics:
         """Analyze a knowledge graph and generate insights."""
         try:
-            # Retrieve graph
-            doc = self.firestore.db.collection('knowledge_graphs').document(graph_id).get()
-            if not doc.exists:
+            # Retrieve graph without blocking the event loop
+            loader = loader or self.create_graph_loader()
+            graph = await loader.load(graph_id)
+            if graph is None:
                 raise ValueError(f"Graph {graph_id} not found")
             
-            graph = KnowledgeGraph.from_dict(doc.to_dict())
-            
-            # Perform analysis
-            analytics = GraphAnalytics(graph_id=graph_id)
-            
-            # Most frequent products
-            products = graph.get_entities_by_type("product")
-            product_counts = {}
-            for product in products:
-                name = product.name.lower()
-                if name not in product_counts:
-                    product_counts[name] = {"name": product.name, "count": 0, "total_spent": 0}
-                product_counts[name]["count"] += 1
-                product_counts[name]["total_spent"] += product.attributes.get("total_price", 0)
-            
-            analytics.most_frequent_products = sorted(
-                product_counts.values(), 
-                key=lambda x: x["count"], 
-                reverse=True
-            )[:10]
-            
-            # Most frequent merchants
-            merchants = graph.get_entities_by_type("merchant")
-            merchant_counts = {}
-            for merchant in merchants:
-                # Count relations to this merchant
-                relations = graph.get_relations_for_entity(merchant.id)
-                purchase_relations = [r for r in relations if r.relation_type == "purchased_at"]
-                merchant_counts[merchant.name] = {
-                    "name": merchant.name,
-                    "visit_count": len(purchase_relations),
-                    "total_spent": sum(r.attributes.get("price", 0) for r in purchase_relations)
-                }
-            
-            analytics.most_frequent_merchants = sorted(
-                merchant_counts.values(),
-                key=lambda x: x["visit_count"],
-                reverse=True
-            )[:10]
-            
-            # Category distribution
-            categories = graph.get_entities_by_type("category")
-            for category in categories:
-                relations = graph.get_relations_for_entity(category.id)
-                category_relations = [r for r in relations if r.relation_type == "belongs_to_category"]
-                analytics.category_distribution[category.name] = len(category_relations)
-            
-            # Relation type counts
-            for relation in graph.relations:
-                rel_type = relation.relation_type
-                analytics.relation_type_counts[rel_type] = analytics.relation_type_counts.get(rel_type, 0) + 1
+            return self._compute_graph_analytics(graph_id, graph)
             
-            # Total receipts analyzed
-            analytics.total_receipts_analyzed = len(graph.receipt_ids)
+        except Exception as e:
+            self.log_error("analyze_graph", e, graph_id=graph_id)
+            raise
+    
+    async def analyze_graphs(self, graph_ids: List[str], loader: Optional[GraphLoader] = None) -> List[GraphAnalytics]:
+        """Analyze several knowledge graphs, fetching them in one batched read."""
+        try:
+            loader = loader or self.create_graph_loader()
+            graphs = await loader.load_many(graph_ids)
+            missing = [graph_id for graph_id, graph in zip(graph_ids, graphs) if graph is None]
+            if missing:
+                raise ValueError(f"Graphs {missing} not found")
             
-            return analytics
+            return [self._compute_graph_analytics(graph_id, graph) for graph_id, graph in zip(graph_ids, graphs)]
             
         except Exception as e:
-            self.log_error("analyze_graph", e, graph_id=graph_id)
+            self.log_error("analyze_graphs", e, graph_count=len(graph_ids))
             raise
-
+    
+    def _compute_graph_analytics(self, graph_id: str, graph: KnowledgeGraph) -> GraphAnalytics:
+        """Aggregate product, merchant, category and relation statistics for a graph."""
+        # Perform analysis
+        analytics = GraphAnalytics(graph_id=graph_id)
+        
+        # Most frequent products, keyed by lowercased name; the first spelling seen is shown
+        products = [entity for entity in graph.entities if _is_product(entity)]
+        product_counts = Counter()
+        product_totals = {}
+        product_names = {}
+        for product in products:
+            key = product.name.lower()
+            product_names.setdefault(key, product.name)
+            product_counts[key] += 1
+            product_totals[key] = product_totals.get(key, 0) + _total_price_of(product)
+        
+        analytics.most_frequent_products = [
+            {"name": product_names[key], "count": count, "total_spent": product_totals[key]}
+            for key, count in product_counts.most_common(10)
+        ]
+        
+        # Tally relation types, merchant purchases and category memberships in one pass.
+        # Both endpoints are credited, as get_relations_for_entity would match either.
+        relation_type_counts = Counter()
+        purchase_counts = Counter()
+        purchase_totals = {}
+        category_counts = Counter()
+        for relation in graph.relations:
+            relation_type = relation.relation_type
+            relation_type_counts[relation_type] += 1
+            if relation_type == "purchased_at":
+                price = _price_of(relation.attributes)
+                for entity_id in {relation.source_entity_id, relation.target_entity_id}:
+                    purchase_counts[entity_id] += 1
+                    purchase_totals[entity_id] = purchase_totals.get(entity_id, 0) + price
+            elif relation_type == "belongs_to_category":
+                for entity_id in {relation.source_entity_id, relation.target_entity_id}:
+                    category_counts[entity_id] += 1
+        
+        # Most frequent merchants
+        merchant_counts = {}
+        for merchant in graph.get_entities_by_type("merchant"):
+            merchant_counts[merchant.name] = {
+                "name": merchant.name,
+                "visit_count": purchase_counts[merchant.id],
+                "total_spent": purchase_totals.get(merchant.id, 0)
+            }
+        
+        analytics.most_frequent_merchants = heapq.nlargest(
+            10, merchant_counts.values(), key=lambda x: x["visit_count"]
+        )
+        
+        # Category distribution
+        for category in graph.get_entities_by_type("category"):
+            analytics.category_distribution[category.name] = category_counts[category.id]
+        
+        # Relation type counts
+        analytics.relation_type_counts = dict(relation_type_counts)
+        
+        # Total receipts analyzed
+        analytics.total_receipts_analyzed = len(graph.receipt_ids)
+        
+        return analytics
 
 # Global instance
 graph_builder_agent = GraphBuilderAgent()
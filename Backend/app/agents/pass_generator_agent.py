@@ -2,14 +2,74 @@
 Pass Generator Agent for creating Google Wallet passes from Knowledge Graph data.
 """
 
+import asyncio
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-from ..services.firestore_service import FirestoreService
+from google.cloud import firestore
+from google.cloud.firestore_v1 import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from ..services.firestore_service import FirestoreService, MAX_BATCH_WRITES
 from ..services.wallet import GoogleWalletService
 from ..models.wallet import WalletEligibleItem, PassGenerationRequest, PassGenerationResponse
+from ..utils.config import settings
 from ..utils.logging import LoggerMixin
 
+# Strong references to in-flight background wallet inserts so they aren't garbage collected
+_background_inserts = set()
+
+
+# Wallet status fields on a KG document and the ID key each entry carries
+_WALLET_STATE_KEYS = {'receipts': 'receipt_id', 'warranties': 'warranty_id'}
+
+# KG document fields read when listing wallet-eligible items
+_WALLET_KG_FIELDS = [
+    'data.graph_built', 'data.created_at', 'data.receipt_name', 'data.total_amount',
+    'data.currency', 'data.receipt_summary', 'merchant_details.merchant.name',
+    'analytics.item_count', 'receipts', 'warranties', 'products'
+]
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso(value) -> Optional[datetime]:
+    """Parse an ISO 8601 (or plain YYYY-MM-DD) date string, returning None if it isn't one."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return None
+
+
+def _product_key(name: str) -> str:
+    """Normalize a product name to the key used in warranty item IDs."""
+    return name.replace(' ', '_').lower()
+
+
+def _wallet_state_map(entries, id_key: str) -> Dict[str, Dict[str, Any]]:
+    """Return a wallet status field as {item_id: state}, accepting the legacy list layout."""
+    if isinstance(entries, dict):
+        return entries
+    return {entry[id_key]: entry for entry in entries or [] if entry.get(id_key)}
+
+
+@firestore.async_transactional
+async def _convert_wallet_state_to_maps(transaction, doc_ref) -> bool:
+    """Rewrite a KG document's list-layout wallet status fields as maps keyed by item ID."""
+    snapshot = await doc_ref.get(field_paths=list(_WALLET_STATE_KEYS), transaction=transaction)
+    doc_data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+    updates = {
+        field: _wallet_state_map(doc_data[field], id_key)
+        for field, id_key in _WALLET_STATE_KEYS.items()
+        if isinstance(doc_data.get(field), list)
+    }
+    if updates:
+        transaction.update(doc_ref, updates)
+    return bool(updates)
+
 
 class PassGeneratorAgent(LoggerMixin):
     """
@@ -23,6 +83,11 @@ class PassGeneratorAgent(LoggerMixin):
     def __init__(self):
         self.firestore = FirestoreService()
         self.wallet_service = GoogleWalletService()
+        # Pass object builder per supported pass type
+        self.pass_object_builders = {
+            "receipt": self.wallet_service.create_receipt_pass_object,
+            "warranty": self.wallet_service.create_warranty_pass_object
+        }
         self.logger.info("Pass Generator Agent initialized")
     
     async def get_eligible_wallet_items(self, user_id: str) -> List[WalletEligibleItem]:
@@ -47,17 +112,8 @@ class PassGeneratorAgent(LoggerMixin):
             
             # Process each knowledge graph entry
             for kg_id, kg_entry in kg_data.items():
-                if not kg_entry.get('data', {}).get('graph_built', False):
-                    continue  # Skip incomplete knowledge graphs
-                
-                # Add receipt as eligible item
-                receipt_item = self._transform_receipt_to_wallet_item(kg_id, kg_entry)
-                if receipt_item:
-                    eligible_items.append(receipt_item)
-                
-                # Add warranty items
-                warranty_items = self._transform_warranties_to_wallet_items(kg_id, kg_entry)
-                eligible_items.extend(warranty_items)
+                # Receipt and its warranty items
+                eligible_items.extend(self._transform_kg_entry_to_wallet_items(kg_id, kg_entry))
             
             self.logger.info(f"Found {len(eligible_items)} eligible wallet items for user {user_id}")
             return eligible_items
@@ -77,8 +133,11 @@ class PassGeneratorAgent(LoggerMixin):
             PassGenerationResponse with JWT token or error
         """
         try:
+            # Read the single KG document backing this item; reused for the status update
+            kg_doc = await self._fetch_kg_doc_for_item(request.item_id, request.user_id)
+            
             # Get the specific item data
-            item_data = await self._get_item_data(request.item_id, request.user_id)
+            item_data = self._get_item_data(request.item_id, kg_doc)
             
             if not item_data:
                 return PassGenerationResponse(
@@ -87,30 +146,24 @@ class PassGeneratorAgent(LoggerMixin):
                 )
             
             # Generate pass object based on type
-            if request.pass_type == "receipt":
-                pass_object = self.wallet_service.create_receipt_pass_object(item_data)
-            elif request.pass_type == "warranty":
-                pass_object = self.wallet_service.create_warranty_pass_object(item_data)
-            else:
+            build_pass_object = self.pass_object_builders.get(request.pass_type)
+            if build_pass_object is None:
                 return PassGenerationResponse(
                     success=False,
                     error=f"Unsupported pass type: {request.pass_type}"
                 )
+            pass_object = build_pass_object(item_data)
             
-            # Insert object to Google Wallet first
-            insert_success = self.wallet_service.insert_object_to_google_wallet(pass_object)
-            
-            if not insert_success:
-                self.logger.warning("Failed to insert object to Google Wallet, but continuing with JWT generation")
-            
-            # Sign JWT token
-            jwt_token = self.wallet_service.sign_jwt(pass_object)
+            # The JWT embeds the pass object itself, so the Google Wallet insert
+            # runs in the background instead of delaying the save URL
+            self._insert_in_background(pass_object)
+            jwt_token = await asyncio.to_thread(self.wallet_service.sign_jwt, pass_object)
             
             # Create wallet save URL
             wallet_url = self.wallet_service.create_wallet_save_url(jwt_token)
             
             # Update item status in Firestore (mark as added to wallet)
-            await self._update_wallet_status(request.item_id, request.user_id, pass_object["id"])
+            await self._update_wallet_status(request.item_id, kg_doc, pass_object["id"])
             
             return PassGenerationResponse(
                 success=True,
@@ -126,44 +179,159 @@ class PassGeneratorAgent(LoggerMixin):
                 error=str(e)
             )
     
+    async def generate_wallet_passes(self, requests: List[PassGenerationRequest]) -> List[PassGenerationResponse]:
+        """
+        Generate signed JWT tokens for several wallet items at once.
+        
+        The KG documents behind all items are read in one round trip, every pass is
+        signed concurrently, and the wallet status updates are committed in a single
+        write batch.
+        
+        Args:
+            requests: Pass generation requests
+            
+        Returns:
+            PassGenerationResponse per request, in request order
+        """
+        responses: List[Optional[PassGenerationResponse]] = [None] * len(requests)
+        
+        try:
+            kg_docs = await self._fetch_kg_docs_for_items(requests)
+            
+            # Build pass objects; ineligible items fail on their own
+            pending = []
+            for index, request in enumerate(requests):
+                kg_doc = kg_docs.get(index)
+                item_data = self._get_item_data(request.item_id, kg_doc)
+                if not item_data:
+                    responses[index] = PassGenerationResponse(
+                        success=False,
+                        error=f"Item {request.item_id} not found or not eligible"
+                    )
+                    continue
+                
+                build_pass_object = self.pass_object_builders.get(request.pass_type)
+                if build_pass_object is None:
+                    responses[index] = PassGenerationResponse(
+                        success=False,
+                        error=f"Unsupported pass type: {request.pass_type}"
+                    )
+                    continue
+                pending.append((index, kg_doc, build_pass_object(item_data)))
+            
+            for _, _, pass_object in pending:
+                self._insert_in_background(pass_object)
+            
+            results = await asyncio.gather(
+                *[asyncio.to_thread(self.wallet_service.sign_jwt, pass_object) for _, _, pass_object in pending],
+                return_exceptions=True
+            )
+            
+            # Convert each list-layout KG document behind a signed pass once, concurrently
+            unconverted = await self._convert_wallet_state_layouts([
+                kg_doc for (_, kg_doc, _), result in zip(pending, results)
+                if not isinstance(result, Exception)
+            ])
+            
+            # One timestamp for the whole batch
+            added_at = datetime.now().isoformat()
+            status_writes = []
+            for (index, kg_doc, pass_object), result in zip(pending, results):
+                request = requests[index]
+                if isinstance(result, Exception):
+                    self.log_error("generate_wallet_passes", result, item_id=request.item_id)
+                    responses[index] = PassGenerationResponse(success=False, error=str(result))
+                    continue
+                
+                jwt_token = result
+                
+                try:
+                    # A field-path write would clobber a status array that failed to convert
+                    if kg_doc.reference.path not in unconverted:
+                        updates = self._wallet_status_updates(request.item_id, kg_doc, pass_object["id"], added_at)
+                        if updates:
+                            status_writes.append((kg_doc.reference, updates))
+                except Exception as e:
+                    self.log_error("_update_wallet_status", e, item_id=request.item_id)
+                
+                responses[index] = PassGenerationResponse(
+                    success=True,
+                    jwt=jwt_token,
+                    pass_id=pass_object["id"],
+                    wallet_url=self.wallet_service.create_wallet_save_url(jwt_token)
+                )
+            
+            # Mark all issued passes as added to wallet in as few commits as possible
+            try:
+                for start in range(0, len(status_writes), MAX_BATCH_WRITES):
+                    batch = self.firestore.async_db.batch()
+                    for doc_ref, updates in status_writes[start:start + MAX_BATCH_WRITES]:
+                        batch.update(doc_ref, updates)
+                    await batch.commit()
+            except Exception as e:
+                self.log_error("_update_wallet_status", e)
+            
+            return responses
+            
+        except Exception as e:
+            self.log_error("generate_wallet_passes", e)
+            return [
+                response or PassGenerationResponse(success=False, error=str(e))
+                for response in responses
+            ]
+    
+    def _insert_in_background(self, pass_object: Dict[str, Any]) -> None:
+        """Insert a pass object to Google Wallet without waiting; failures are only logged."""
+        task = asyncio.create_task(
+            asyncio.to_thread(self.wallet_service.insert_object_to_google_wallet, pass_object)
+        )
+        _background_inserts.add(task)
+        
+        def _log_result(done: asyncio.Task):
+            _background_inserts.discard(done)
+            if done.cancelled():
+                return
+            if done.exception() is not None:
+                self.log_error("insert_object_to_google_wallet", done.exception(), pass_id=pass_object["id"])
+            elif not done.result():
+                self.logger.warning(f"Failed to insert object {pass_object['id']} to Google Wallet, but continuing with JWT generation")
+        
+        task.add_done_callback(_log_result)
+    
     async def _fetch_user_kg_data(self, user_id: str) -> Dict[str, Any]:
         """Fetch user's knowledge graph data from Firestore."""
         try:
             self.logger.info(f"Fetching KG data for user_id: {user_id}")
             
             # Query Firestore for user's knowledge graphs subcollection
-            kg_collection_ref = self.firestore.db.collection('users').document(user_id).collection('knowledge_graphs')
-            docs = kg_collection_ref.stream()
-            
+            kg_collection_ref = self.firestore.async_db.collection('users').document(user_id).collection('knowledge_graphs')
+            # Only complete graphs, projected to the wallet fields
+            query = kg_collection_ref.where(filter=FieldFilter('data.graph_built', '==', True)).select(_WALLET_KG_FIELDS)
             kg_data = {}
-            for doc in docs:
-                if doc.exists:
-                    doc_data = doc.to_dict()
-                    # Only include documents that have complete graph data
-                    if doc_data and doc_data.get('data', {}).get('graph_built', False):
-                        kg_data[doc.id] = doc_data
-                        self.logger.info(f"Found valid KG document: {doc.id} for user {user_id}")
+            async for doc in query.stream():
+                kg_data[doc.id] = doc.to_dict()
+                self.logger.info(f"Found valid KG document: {doc.id} for user {user_id}")
             
             self.logger.info(f"Fetched {len(kg_data)} knowledge graph documents for user {user_id}")
             
-            # If no data found for this user, check if there are similar users (for debugging)
             if not kg_data:
                 self.logger.warning(f"No KG data found for user {user_id}")
-                # Check for potential alternative user IDs (for debugging only)
+            
+            # Check if there are similar users (for debugging only; extra reads, so opt-in)
+            if not kg_data and settings.debug_kg_probes:
                 alt_users = []
                 if user_id == "sample":
                     alt_users = ["sam", "flutter_user_1753337340086"]
                 elif user_id == "sam":
                     alt_users = ["sample", "flutter_user_1753337340086"]
                 
-                for alt_user in alt_users:
-                    try:
-                        alt_kg_ref = self.firestore.db.collection('users').document(alt_user).collection('knowledge_graphs')
-                        alt_docs = list(alt_kg_ref.stream())
-                        if alt_docs:
-                            self.logger.info(f"Found {len(alt_docs)} documents under alternative user: {alt_user}")
-                    except:
-                        pass
+                async def _probe(alt_user: str):
+                    alt_kg_ref = self.firestore.async_db.collection('users').document(alt_user).collection('knowledge_graphs')
+                    alt_docs = [doc async for doc in alt_kg_ref.stream()]
+                    if alt_docs:
+                        self.logger.info(f"Found {len(alt_docs)} documents under alternative user: {alt_user}")
+                
+                await asyncio.gather(*[_probe(alt_user) for alt_user in alt_users], return_exceptions=True)
             
             return kg_data
             
@@ -171,33 +339,27 @@ class PassGeneratorAgent(LoggerMixin):
             self.log_error("_fetch_user_kg_data", e)
             return {}
     
-    def _transform_receipt_to_wallet_item(self, kg_id: str, kg_entry: Dict[str, Any]) -> Optional[WalletEligibleItem]:
-        """Transform knowledge graph receipt data to wallet item."""
+    def _transform_kg_entry_to_wallet_items(self, kg_id: str, kg_entry: Dict[str, Any]) -> List[WalletEligibleItem]:
+        """Transform one knowledge graph entry into its receipt and warranty wallet items in a single pass."""
+        # Fields are built from already-parsed KG data, so items are constructed without
+        # re-validation; the response model still validates them at the API boundary
+        wallet_items = []
+        
+        # Shared by the receipt and its warranties
+        data = kg_entry.get('data', {})
+        created_at_str = data.get('created_at', '')
+        created_date = None
+        if created_at_str:
+            parsed = _parse_iso(created_at_str)
+            created_date = parsed.date() if parsed else datetime.now().date()
+        
         try:
-            data = kg_entry.get('data', {})
-            merchant_details = kg_entry.get('merchant_details', {})
-            merchant = merchant_details.get('merchant', {})
+            merchant = kg_entry.get('merchant_details', {}).get('merchant', {})
             
-            # Check wallet status from receipts array in KG data
-            added_to_wallet = False
-            wallet_pass_id = None
-            receipts = kg_entry.get('receipts', [])
-            for receipt in receipts:
-                if receipt.get('receipt_id') == kg_id:
-                    added_to_wallet = receipt.get('addedToWallet', False)
-                    wallet_pass_id = receipt.get('walletPassId')
-                    break
-            
-            # Parse transaction date
-            created_at_str = data.get('created_at', '')
-            transaction_date = None
-            if created_at_str:
-                try:
-                    transaction_date = datetime.fromisoformat(created_at_str.replace('+05:30', '+05:30')).date()
-                except:
-                    transaction_date = datetime.now().date()
+            # Check wallet status from receipts in KG data
+            receipt_state = _wallet_state_map(kg_entry.get('receipts'), 'receipt_id').get(kg_id, {})
             
-            return WalletEligibleItem(
+            wallet_items.append(WalletEligibleItem.model_construct(
                 id=f"receipt_{kg_id}",
                 title=data.get('receipt_name', 'Unknown Receipt'),
                 subtitle=f"{data.get('receipt_summary', 'Receipt')} • {data.get('currency', 'USD')} {data.get('total_amount', 0.00):.2f}",
@@ -208,62 +370,34 @@ class PassGeneratorAgent(LoggerMixin):
                 merchant_name=merchant.get('name', 'Unknown Merchant'),
                 total_amount=data.get('total_amount', 0.00),
                 currency=data.get('currency', 'USD'),
-                transaction_date=transaction_date,
+                transaction_date=created_date,
                 item_count=kg_entry.get('analytics', {}).get('item_count', 0),
                 
                 # Wallet status from Firestore
-                added_to_wallet=added_to_wallet,
-                wallet_pass_id=wallet_pass_id
-            )
+                added_to_wallet=receipt_state.get('addedToWallet', False),
+                wallet_pass_id=receipt_state.get('walletPassId')
+            ))
             
         except Exception as e:
-            self.log_error("_transform_receipt_to_wallet_item", e)
-            return None
-    
-    def _transform_warranties_to_wallet_items(self, kg_id: str, kg_entry: Dict[str, Any]) -> List[WalletEligibleItem]:
-        """Transform warranty products to wallet items."""
-        warranty_items = []
+            self.log_error("_transform_kg_entry_to_wallet_items", e, item_type="receipt", kg_id=kg_id)
         
         try:
-            products = kg_entry.get('products', [])
-            data = kg_entry.get('data', {})
-            
-            # Parse purchase date
-            created_at_str = data.get('created_at', '')
-            purchase_date = None
-            if created_at_str:
-                try:
-                    purchase_date = datetime.fromisoformat(created_at_str.replace('+05:30', '+05:30')).date()
-                except:
-                    purchase_date = datetime.now().date()
+            # Index wallet status once so each product is a single lookup
+            warranty_by_id = _wallet_state_map(kg_entry.get('warranties'), 'warranty_id')
             
-            for product in products:
+            for product in kg_entry.get('products', []):
                 if product.get('warranty', False) and product.get('expiry_date'):
                     # Generate warranty ID for comparison
-                    warranty_id = f"warranty_{kg_id}_{product['name'].replace(' ', '_').lower()}"
+                    warranty_id = f"warranty_{kg_id}_{_product_key(product['name'])}"
                     
-                    # Check wallet status from warranties array in KG data
-                    added_to_wallet = False
-                    wallet_pass_id = None
-                    warranties = kg_entry.get('warranties', [])
-                    for warranty in warranties:
-                        if warranty.get('warranty_id') == warranty_id:
-                            added_to_wallet = warranty.get('addedToWallet', False)
-                            wallet_pass_id = warranty.get('walletPassId')
-                            break
+                    # Check wallet status from warranties in KG data
+                    warranty_state = warranty_by_id.get(warranty_id, {})
                     
                     # Parse expiry date
-                    expiry_date = None
-                    if product.get('expiry_date'):
-                        try:
-                            expiry_date = datetime.fromisoformat(product['expiry_date']).date()
-                        except:
-                            try:
-                                expiry_date = datetime.strptime(product['expiry_date'], '%Y-%m-%d').date()
-                            except:
-                                expiry_date = None
+                    parsed = _parse_iso(product['expiry_date'])
+                    expiry_date = parsed.date() if parsed else None
                     
-                    warranty_item = WalletEligibleItem(
+                    wallet_items.append(WalletEligibleItem.model_construct(
                         id=warranty_id,
                         title=f"{product['name']} Warranty",
                         subtitle=f"Brand: {product.get('brand', 'Unknown')} • Expires: {product.get('expiry_date', 'Unknown')}",
@@ -275,29 +409,86 @@ class PassGeneratorAgent(LoggerMixin):
                         brand=product.get('brand', 'Unknown'),
                         warranty_period=product.get('warranty_period', 'Unknown'),
                         expiry_date=expiry_date,
-                        purchase_date=purchase_date,
+                        purchase_date=created_date,
                         
                         # Wallet status from Firestore
-                        added_to_wallet=added_to_wallet,
-                        wallet_pass_id=wallet_pass_id
-                    )
-                    
-                    warranty_items.append(warranty_item)
+                        added_to_wallet=warranty_state.get('addedToWallet', False),
+                        wallet_pass_id=warranty_state.get('walletPassId')
+                    ))
             
         except Exception as e:
-            self.log_error("_transform_warranties_to_wallet_items", e)
+            self.log_error("_transform_kg_entry_to_wallet_items", e, item_type="warranty", kg_id=kg_id)
         
-        return warranty_items
+        return wallet_items
+    
+    def _kg_doc_id_for_item(self, item_id: str) -> Optional[str]:
+        """Resolve the knowledge graph document ID referenced by a wallet item ID."""
+        prefix, _, rest = item_id.partition('_')
+        if prefix == "receipt":
+            return rest
+        elif prefix == "warranty":
+            # Warranty item ID: warranty_{receipt_id}_{product_name}
+            receipt_id, sep, _ = rest.partition('_')
+            if sep:
+                return receipt_id
+        return None
     
-    async def _get_item_data(self, item_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific item data for pass generation."""
+    async def _fetch_kg_doc_for_item(self, item_id: str, user_id: str):
+        """Fetch the knowledge graph document snapshot for a wallet item, or None."""
         try:
+            receipt_id = self._kg_doc_id_for_item(item_id)
+            if not receipt_id:
+                return None
+            
+            doc = await self.firestore.async_db.collection('users').document(user_id)\
+                .collection('knowledge_graphs').document(receipt_id).get()
+            return doc if doc.exists else None
+            
+        except Exception as e:
+            self.log_error("_fetch_kg_doc_for_item", e)
+            return None
+    
+    async def _fetch_kg_docs_for_items(self, requests: List[PassGenerationRequest]) -> Dict[int, Any]:
+        """Fetch the KG document snapshots for several wallet items in one read, keyed by request index."""
+        refs = {}
+        for index, request in enumerate(requests):
+            receipt_id = self._kg_doc_id_for_item(request.item_id)
+            if receipt_id:
+                refs[index] = self.firestore.async_db.collection('users').document(request.user_id)\
+                    .collection('knowledge_graphs').document(receipt_id)
+        
+        if not refs:
+            return {}
+        
+        unique_refs = {ref.path: ref for ref in refs.values()}
+        snapshots = {}
+        async for doc in self.firestore.async_db.get_all(list(unique_refs.values())):
+            if doc.exists:
+                snapshots[doc.reference.path] = doc
+        
+        return {
+            index: snapshots[ref.path]
+            for index, ref in refs.items()
+            if ref.path in snapshots
+        }
+    
+    def _get_item_data(self, item_id: str, kg_doc) -> Optional[Dict[str, Any]]:
+        """Get specific item data for pass generation from its knowledge graph document."""
+        try:
+            if kg_doc is None:
+                return None
+            
+            kg_entry = kg_doc.to_dict()
+            # Only complete knowledge graphs are eligible
+            if not kg_entry or not kg_entry.get('data', {}).get('graph_built', False):
+                return None
+            
             # Parse item ID to determine type and get data
-            if item_id.startswith("receipt_"):
-                receipt_id = item_id.replace("receipt_", "")
-                return await self._get_receipt_data(receipt_id, user_id)
-            elif item_id.startswith("warranty_"):
-                return await self._get_warranty_data(item_id, user_id)
+            prefix = item_id.partition('_')[0]
+            if prefix == "receipt":
+                return self._get_receipt_data(kg_doc.id, kg_entry)
+            elif prefix == "warranty":
+                return self._get_warranty_data(item_id, kg_entry)
             
             return None
             
@@ -305,15 +496,9 @@ class PassGeneratorAgent(LoggerMixin):
             self.log_error("_get_item_data", e)
             return None
     
-    async def _get_receipt_data(self, receipt_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    def _get_receipt_data(self, receipt_id: str, kg_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Get receipt data for pass generation."""
         try:
-            kg_data = await self._fetch_user_kg_data(user_id)
-            kg_entry = kg_data.get(receipt_id)
-            
-            if not kg_entry:
-                return None
-            
             data = kg_entry.get('data', {})
             merchant_details = kg_entry.get('merchant_details', {})
             merchant = merchant_details.get('merchant', {})
@@ -322,11 +507,9 @@ class PassGeneratorAgent(LoggerMixin):
             created_at_str = data.get('created_at', '')
             transaction_date = 'Unknown date'
             if created_at_str:
-                try:
-                    dt = datetime.fromisoformat(created_at_str.replace('+05:30', '+05:30'))
+                dt = _parse_iso(created_at_str)
+                if dt:
                     transaction_date = dt.strftime('%B %d, %Y')
-                except:
-                    transaction_date = 'Unknown date'
             
             return {
                 'receipt_id': receipt_id,
@@ -341,31 +524,20 @@ class PassGeneratorAgent(LoggerMixin):
             self.log_error("_get_receipt_data", e)
             return None
     
-    async def _get_warranty_data(self, item_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    def _get_warranty_data(self, item_id: str, kg_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Get warranty data for pass generation."""
         try:
             # Parse warranty item ID: warranty_{receipt_id}_{product_name}
-            parts = item_id.split('_', 2)
-            if len(parts) < 3:
-                return None
-            
-            receipt_id = parts[1]
-            product_name_key = parts[2]
-            
-            kg_data = await self._fetch_user_kg_data(user_id)
-            kg_entry = kg_data.get(receipt_id)
-            
-            if not kg_entry:
+            receipt_id, sep, product_name_key = item_id.partition('_')[2].partition('_')
+            if not sep:
                 return None
             
-            # Find the specific product
+            # Find the specific product; stops at the first match
             products = kg_entry.get('products', [])
-            target_product = None
-            
-            for product in products:
-                if product['name'].replace(' ', '_').lower() == product_name_key:
-                    target_product = product
-                    break
+            target_product = next(
+                (product for product in products if _product_key(product['name']) == product_name_key),
+                None
+            )
             
             if not target_product or not target_product.get('warranty', False):
                 return None
@@ -375,23 +547,14 @@ class PassGeneratorAgent(LoggerMixin):
             created_at_str = data.get('created_at', '')
             purchase_date = 'Unknown'
             if created_at_str:
-                try:
-                    dt = datetime.fromisoformat(created_at_str.replace('+05:30', '+05:30'))
+                dt = _parse_iso(created_at_str)
+                if dt:
                     purchase_date = dt.strftime('%B %d, %Y')
-                except:
-                    purchase_date = 'Unknown'
             
             expiry_date = 'Unknown'
             if target_product.get('expiry_date'):
-                try:
-                    dt = datetime.fromisoformat(target_product['expiry_date'])
-                    expiry_date = dt.strftime('%B %d, %Y')
-                except:
-                    try:
-                        dt = datetime.strptime(target_product['expiry_date'], '%Y-%m-%d')
-                        expiry_date = dt.strftime('%B %d, %Y')
-                    except:
-                        expiry_date = target_product['expiry_date']
+                dt = _parse_iso(target_product['expiry_date'])
+                expiry_date = dt.strftime('%B %d, %Y') if dt else target_product['expiry_date']
             
             return {
                 'receipt_id': receipt_id,
@@ -406,77 +569,76 @@ class PassGeneratorAgent(LoggerMixin):
             self.log_error("_get_warranty_data", e)
             return None
     
-    async def _update_wallet_status(self, item_id: str, user_id: str, pass_id: str):
+    async def _update_wallet_status(self, item_id: str, kg_doc, pass_id: str):
         """Update item status to indicate it's been added to wallet."""
         try:
-            # Extract the actual ID based on item type
-            if item_id.startswith("receipt_"):
-                actual_id = item_id.replace("receipt_", "")
-                item_type = "receipt"
-            elif item_id.startswith("warranty_"):
-                actual_id = item_id
-                item_type = "warranty"
-            else:
-                self.logger.error(f"Unknown item type for ID: {item_id}")
+            # A field-path write would clobber a status array that failed to convert
+            if await self._convert_wallet_state_layouts([kg_doc]):
                 return
             
-            # Update the wallet status in Firestore
-            kg_collection = self.firestore.db.collection('users').document(user_id).collection('knowledge_graphs')
-            
-            # Find the document containing this item
-            docs = kg_collection.stream()
-            for doc in docs:
-                doc_data = doc.to_dict()
-                self.logger.info(f"Processing document {doc.id} for item {actual_id}")
-                self.logger.info(f"Document keys: {list(doc_data.keys()) if doc_data else 'None'}")
-                
-                if item_type == "receipt":
-                    # Check if this document IS the receipt we're looking for
-                    if doc.id == actual_id:
-                        # Initialize receipts array if it doesn't exist
-                        if 'receipts' not in doc_data:
-                            doc_data['receipts'] = []
-                        
-                        # Check if receipt already exists in array
-                        receipt_found = False
-                        for receipt in doc_data['receipts']:
-                            if receipt.get('receipt_id') == actual_id:
-                                # Update existing receipt
-                                receipt['addedToWallet'] = True
-                                receipt['walletPassId'] = pass_id
-                                receipt['walletAddedAt'] = datetime.now().isoformat()
-                                receipt_found = True
-                                break
-                        
-                        # If receipt not found in array, add it
-                        if not receipt_found:
-                            doc_data['receipts'].append({
-                                'receipt_id': actual_id,
-                                'addedToWallet': True,
-                                'walletPassId': pass_id,
-                                'walletAddedAt': datetime.now().isoformat()
-                            })
-                        
-                        # Update the document
-                        doc.reference.update({'receipts': doc_data['receipts']})
-                        self.logger.info(f"Updated wallet status for receipt {actual_id} with pass ID {pass_id}")
-                        return
-                            
-                elif item_type == "warranty" and doc_data and 'warranties' in doc_data:
-                    warranties = doc_data['warranties']
-                    for warranty in warranties:
-                        if warranty.get('warranty_id') == actual_id:
-                            # Update the warranty with wallet status
-                            warranty['addedToWallet'] = True
-                            warranty['walletPassId'] = pass_id
-                            warranty['walletAddedAt'] = datetime.now().isoformat()
-                            
-                            # Update the document
-                            doc.reference.update({'warranties': warranties})
-                            self.logger.info(f"Updated wallet status for warranty {actual_id} with pass ID {pass_id}")
-                            return
-            
-            self.logger.warning(f"Could not find item {item_id} (actual_id: {actual_id}) to update wallet status")
+            updates = self._wallet_status_updates(item_id, kg_doc, pass_id)
+            if updates:
+                await kg_doc.reference.update(updates)
+                self.logger.info(f"Updated wallet status for {item_id} with pass ID {pass_id}")
             
         except Exception as e:
             self.log_error("_update_wallet_status", e)
+    
+    async def _convert_wallet_state_layouts(self, kg_docs) -> set:
+        """
+        Convert the list-layout wallet status fields of the given KG documents to maps,
+        once per distinct document and concurrently.
+        
+        Returns:
+            Paths of the documents that still need converting because it failed
+        """
+        to_convert = {}
+        for kg_doc in kg_docs:
+            if kg_doc is None:
+                continue
+            doc_data = kg_doc.to_dict() or {}
+            if any(isinstance(doc_data.get(field), list) for field in _WALLET_STATE_KEYS):
+                to_convert[kg_doc.reference.path] = kg_doc.reference
+        
+        results = await asyncio.gather(
+            *[_convert_wallet_state_to_maps(self.firestore.async_db.transaction(), doc_ref)
+              for doc_ref in to_convert.values()],
+            return_exceptions=True
+        )
+        
+        unconverted = set()
+        for path, result in zip(to_convert, results):
+            if isinstance(result, Exception):
+                self.log_error("_convert_wallet_state_to_maps", result, doc_path=path)
+                unconverted.add(path)
+        return unconverted
+    
+    def _wallet_status_updates(self, item_id: str, kg_doc, pass_id: str,
+                               added_at: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Build the field-path updates marking an item as added to wallet, or None if it can't be."""
+        # Extract the actual ID based on item type
+        prefix, _, rest = item_id.partition('_')
+        if prefix == "receipt":
+            actual_id = rest
+            state_field = 'receipts'
+        elif prefix == "warranty":
+            actual_id = item_id
+            state_field = 'warranties'
+        else:
+            self.logger.error(f"Unknown item type for ID: {item_id}")
+            return None
+        
+        if kg_doc is None:
+            self.logger.warning(f"Could not find item {item_id} (actual_id: {actual_id}) to update wallet status")
+            return None
+        
+        wallet_state = {
+            _WALLET_STATE_KEYS[state_field]: actual_id,
+            'addedToWallet': True,
+            'walletPassId': pass_id,
+            'walletAddedAt': added_at or datetime.now().isoformat()
+        }
+        return {
+            FieldPath(state_field, actual_id, key).to_api_repr(): value
+            for key, value in wallet_state.items()
+        }
@@ -4,21 +4,197 @@ Economix Bot API Routes - Direct Backend Implementation
 Clean implementation with direct Firestore integration.
 """
 
+import asyncio
+import hashlib
+import re
+import sys
+import time
+from collections import OrderedDict
+from functools import lru_cache
+import orjson
 from fastapi import APIRouter, Form, HTTPException, status, Request
-from fastapi.responses import JSONResponse
-from typing import Dict, Any
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+from google.cloud.firestore_v1 import FieldFilter, Query
+from google.cloud.firestore_v1.field_path import FieldPath
+
 from ..services.firestore_service import FirestoreService
-from ..services.gemini_service import GeminiService
+from ..services.gemini_service import FALLBACK_RESPONSE, GeminiService
+from ..utils.config import settings
 from ..utils.logging import get_logger
 
 # Initialize services and logger
-router = APIRouter(prefix="/economix", tags=["economix"])
+router = APIRouter(prefix="/economix", tags=["economix"], default_response_class=ORJSONResponse)
 firestore_service = FirestoreService()
 gemini_service = GeminiService()
 logger = get_logger(__name__)
 
+def _emails_from_user_docs(uid: str) -> Tuple[Optional[str], Optional[str]]:
+    """Methods 1 and 3: emails stored in the users and auth_users documents, read in one round trip."""
+    user_email = auth_email = None
+    try:
+        users_ref = firestore_service.db.collection('users').document(uid)
+        auth_ref = firestore_service.db.collection('auth_users').document(uid)
+        for snapshot in firestore_service.db.get_all([users_ref, auth_ref]):
+            if not snapshot.exists:
+                continue
+            email = (snapshot.to_dict() or {}).get('email')
+            if snapshot.reference.path == users_ref.path:
+                user_email = email
+            else:
+                auth_email = email
+    except Exception as e:
+        logger.debug(f"User/auth document lookup failed: {e}")
+    
+    if user_email:
+        logger.info(f"✅ Found email in user document: {user_email}")
+    if auth_email:
+        logger.info(f"✅ Found email in auth collection: {auth_email}")
+    return user_email, auth_email
+
+
+# Firebase Auth lookups arriving within this window share one get_users RPC
+AUTH_BATCH_WINDOW_SECONDS = 0.005
+# get_users accepts at most this many identifiers per call
+AUTH_BATCH_MAX_UIDS = 100
+_pending_auth_lookups: Optional[Dict[str, asyncio.Future]] = None
+# Strong references to scheduled flushes; the event loop only keeps weak ones
+_auth_flushes = set()
+
+
+# Firebase Auth rejects UIDs that aren't non-empty strings of at most this length
+MAX_FIREBASE_UID_LENGTH = 128
+
+
+def _valid_firebase_uid(uid: Any) -> bool:
+    """Whether Firebase Auth would accept uid as a UidIdentifier."""
+    return isinstance(uid, str) and 0 < len(uid) <= MAX_FIREBASE_UID_LENGTH
+
+
+def _emails_from_firebase_auth(uids: List[str]) -> Dict[str, str]:
+    """
+    Resolve emails for several UIDs through batched Firebase Admin get_users calls.
+    Invalid UIDs are skipped, and a batch that still fails is retried one UID at a
+    time so one bad lookup can't blank the others sharing its batch.
+    """
+    from firebase_admin import auth
+    
+    def _lookup(batch: List[str]) -> None:
+        for user_record in auth.get_users([auth.UidIdentifier(uid) for uid in batch]).users:
+            if user_record.email:
+                emails[user_record.uid] = user_record.email
+    
+    emails = {}
+    valid_uids = [uid for uid in uids if _valid_firebase_uid(uid)]
+    for start in range(0, len(valid_uids), AUTH_BATCH_MAX_UIDS):
+        batch = valid_uids[start:start + AUTH_BATCH_MAX_UIDS]
+        try:
+            _lookup(batch)
+        except Exception as e:
+            logger.debug(f"Batched Firebase Auth lookup failed, retrying per UID: {e}")
+            for uid in batch:
+                try:
+                    _lookup([uid])
+                except Exception as e:
+                    logger.debug(f"Firebase Auth lookup failed for {uid}: {e}")
+    return emails
+
+
+async def _flush_auth_lookups() -> None:
+    """Dispatch the pending Firebase Auth lookups as one batch and resolve their futures."""
+    global _pending_auth_lookups
+    pending, _pending_auth_lookups = _pending_auth_lookups, None
+    
+    try:
+        emails = await asyncio.to_thread(_emails_from_firebase_auth, list(pending))
+    except Exception as e:
+        logger.debug(f"Firebase Auth lookup failed: {e}")
+        emails = {}
+    
+    for uid, future in pending.items():
+        if not future.done():
+            future.set_result(emails.get(uid))
+
+
+def _schedule_auth_flush(loop: asyncio.AbstractEventLoop) -> None:
+    """Start the flush task for the pending batch, holding it until it finishes."""
+    task = loop.create_task(_flush_auth_lookups())
+    _auth_flushes.add(task)
+    task.add_done_callback(_auth_flushes.discard)
+
+
+async def _email_from_firebase_auth(uid: str) -> Optional[str]:
+    """Method 2: Use Firebase Admin SDK to get user email from UID."""
+    global _pending_auth_lookups
+    loop = asyncio.get_running_loop()
+    if _pending_auth_lookups is None:
+        _pending_auth_lookups = {}
+        loop.call_later(AUTH_BATCH_WINDOW_SECONDS, _schedule_auth_flush, loop)
+    
+    future = _pending_auth_lookups.get(uid)
+    if future is None:
+        future = _pending_auth_lookups[uid] = loop.create_future()
+    
+    # Shielded so one caller giving up doesn't cancel the lookup for others sharing it
+    email = await asyncio.shield(future)
+    if email:
+        logger.info(f"✅ Found email via Firebase Auth: {email}")
+    return email
+
+
+def _email_from_sessions(uid: str) -> Optional[str]:
+    """Method 4: Search through user sessions or login records."""
+    try:
+        sessions_collection = firestore_service.db.collection('user_sessions')
+        for session in sessions_collection.where('uid', '==', uid).limit(1).stream():
+            email = session.to_dict().get('email')
+            if email:
+                logger.info(f"✅ Found email in session data: {email}")
+                return email
+    except Exception as e:
+        logger.debug(f"Session lookup failed: {e}")
+    return None
+
+
+
+
+# Resolved UID -> email mappings: uid -> (expires_at, email). Only hits are cached,
+# so a user who gets an email later is picked up on their next turn.
+UID_EMAIL_TTL_SECONDS = 3600
+UID_EMAIL_CACHE_SIZE = 100_000
+_uid_emails: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+
+# UIDs whose lookup is in flight: uid -> task. Concurrent misses for one UID await
+# the same task instead of each issuing their own round trips.
+_uid_email_lookups: Dict[str, asyncio.Task] = {}
+
+
+async def _lookup_user_email(uid: str) -> Optional[str]:
+    """Resolve a UID's email from its sources and cache a hit."""
+    # Run every lookup concurrently, but still prefer them in priority order:
+    # the first method to yield an email wins once all earlier ones came up empty
+    docs_task = asyncio.create_task(asyncio.to_thread(_emails_from_user_docs, uid))
+    auth_task = asyncio.create_task(_email_from_firebase_auth(uid))
+    sessions_task = asyncio.create_task(asyncio.to_thread(_email_from_sessions, uid))
+    try:
+        user_email, auth_email = await docs_task
+        email = user_email or await auth_task or auth_email or await sessions_task
+    finally:
+        for task in (docs_task, auth_task, sessions_task):
+            task.cancel()
+    
+    if email:
+        _uid_emails[uid] = (time.monotonic() + UID_EMAIL_TTL_SECONDS, email)
+        _uid_emails.move_to_end(uid)
+        while len(_uid_emails) > UID_EMAIL_CACHE_SIZE:
+            _uid_emails.popitem(last=False)
+    return email
+
+
 async def get_user_email_from_uid(uid: str) -> str:
     """Get the actual logged-in user's email from Firebase Auth UID."""
     try:
@@ -29,54 +205,20 @@ async def get_user_email_from_uid(uid: str) -> str:
             logger.info(f"✅ UID is already an email: {uid}")
             return uid
         
-        # Method 1: Check if Firebase Auth stores email in user document
-        try:
-            user_doc = firestore_service.db.collection('users').document(uid).get()
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                stored_email = user_data.get('email')
-                if stored_email:
-                    logger.info(f"✅ Found email in user document: {stored_email}")
-                    return stored_email
-        except Exception as e:
-            logger.debug(f"Could not find email in user document: {e}")
+        cached = _uid_emails.get(uid)
+        if cached and cached[0] > time.monotonic():
+            _uid_emails.move_to_end(uid)
+            return cached[1]
         
-        # Method 2: Use Firebase Admin SDK to get user email from UID
-        try:
-            from firebase_admin import auth
-            user_record = auth.get_user(uid)
-            if user_record.email:
-                logger.info(f"✅ Found email via Firebase Auth: {user_record.email}")
-                return user_record.email
-        except Exception as e:
-            logger.debug(f"Firebase Auth lookup failed: {e}")
-        
-        # Method 3: Check authentication collection if it exists
-        try:
-            auth_doc = firestore_service.db.collection('auth_users').document(uid).get()
-            if auth_doc.exists:
-                auth_data = auth_doc.to_dict()
-                email = auth_data.get('email')
-                if email:
-                    logger.info(f"✅ Found email in auth collection: {email}")
-                    return email
-        except Exception as e:
-            logger.debug(f"Auth collection lookup failed: {e}")
+        lookup = _uid_email_lookups.get(uid)
+        if lookup is None:
+            lookup = _uid_email_lookups[uid] = asyncio.create_task(_lookup_user_email(uid))
+            lookup.add_done_callback(lambda _: _uid_email_lookups.pop(uid, None))
         
-        # Method 4: Search through user sessions or login records
-        try:
-            sessions_collection = firestore_service.db.collection('user_sessions')
-            sessions = sessions_collection.where('uid', '==', uid).limit(1).stream()
-            
-            for session in sessions:
-                if session.exists:
-                    session_data = session.to_dict()
-                    email = session_data.get('email')
-                    if email:
-                        logger.info(f"✅ Found email in session data: {email}")
-                        return email
-        except Exception as e:
-            logger.debug(f"Session lookup failed: {e}")
+        # Shielded so one caller giving up doesn't cancel the lookup for others sharing it
+        email = await asyncio.shield(lookup)
+        if email:
+            return email
         
         # If no email found, this means the user is not properly authenticated
         logger.error(f"❌ Could not find email for authenticated UID: {uid}")
@@ -88,78 +230,60 @@ async def get_user_email_from_uid(uid: str) -> str:
         return None
 
 
+# KG document fields read for the financial summary
+_TRANSACTION_FIELDS = ['data.total_amount', 'data.receipt_name', 'data.created_at']
+# Most recent transactions included in the assistant prompt
+RECENT_TRANSACTION_LIMIT = 10
+
+# Per-user financial summaries: user_email -> (expires_at, last_kg_write_ts, summary).
+# Within the TTL an entry is served as-is; after it, the entry is reused only if the
+# user's last_kg_write_ts sentinel hasn't moved. The sentinel is stamped by the
+# stampKnowledgeGraphWrite Cloud Function (frontend/functions) on every write under
+# users/{email}/knowledge_graphs; without that trigger deployed, stale summaries
+# are bounded only by the TTL.
+FINANCIAL_SUMMARY_TTL_SECONDS = 60
+FINANCIAL_SUMMARY_CACHE_SIZE = 10_000
+_financial_summaries: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def _last_kg_write_ts(user_email: str):
+    """Read the user's KG write sentinel, or None if it isn't tracked."""
+    user_doc = firestore_service.db.collection('users').document(user_email).get(field_paths=['last_kg_write_ts'])
+    return (user_doc.to_dict() or {}).get('last_kg_write_ts') if user_doc.exists else None
+
+
+def _valid_email(email: Optional[str]) -> bool:
+    """Cheap format check for a user email used as a Firestore document ID."""
+    return bool(email) and '@' in email and '.' in email.split('@', 1)[1]
+
+
 async def get_user_financial_data(user_email: str) -> Dict[str, Any]:
-    """Fetch user's financial data from Firestore using the user's email address."""
+    """
+    Fetch user's financial data, served from the per-user summary cache when still current.
+    Callers validate the email first (see _valid_email).
+    """
+    now = time.monotonic()
+    cached = _financial_summaries.get(user_email)
+    if cached and cached[0] > now:
+        _financial_summaries.move_to_end(user_email)
+        return cached[2]
+    
     try:
-        logger.info(f"🔍 Fetching financial data for user email: {user_email}")
-        
-        # Validate email format
-        if not user_email or '@' not in user_email:
-            logger.error(f"❌ Invalid email format: {user_email}")
-            return {
-                'user_id': user_email,
-                'total_spent': 0.0,
-                'transaction_count': 0,
-                'transactions': [],
-                'categories': {},
-                'error': f'Invalid email format: {user_email}'
-            }
-        
-        logger.info(f"🔄 Using email directly as document path: {user_email}")
-        
-        # Access user's knowledge graphs collection using email as document path
-        kg_collection_ref = firestore_service.db.collection('users').document(user_email).collection('knowledge_graphs')
-        
-        # Get all documents
-        docs = kg_collection_ref.stream()
-        
-        # Process financial data
-        total_spent = 0.0
-        transactions = []
-        categories = {}
-        
-        for doc in docs:
-            if doc.exists:
-                doc_data = doc.to_dict()
-                
-                # Extract financial information from document
-                if doc_data and 'data' in doc_data:
-                    data = doc_data['data']
-                    
-                    # Get transaction amount
-                    amount = float(data.get('total_amount', 0))
-                    merchant = data.get('receipt_name', 'Unknown Merchant')
-                    date = data.get('created_at', datetime.now().isoformat())
-                    
-                    if amount > 0:  # Only include valid transactions
-                        total_spent += amount
-                        
-                        # Categorize transaction
-                        category = categorize_transaction(merchant)
-                        categories[category] = categories.get(category, 0) + amount
-                        
-                        transactions.append({
-                            'id': doc.id,
-                            'amount': amount,
-                            'merchant': merchant,
-                            'date': date,
-                            'category': category
-                        })
-                        
-                        logger.info(f"📄 Found transaction: {merchant} - ₹{amount}")
-        
-        # Log summary
-        logger.info(f"📊 Summary for {user_email}: ₹{total_spent} total, {len(transactions)} transactions")
-        
-        return {
-            'user_id': user_email,  # Return the email
-            'total_spent': total_spent,
-            'transaction_count': len(transactions),
-            'transactions': transactions,
-            'categories': categories
-        }
-        
+        sentinel = await asyncio.to_thread(_last_kg_write_ts, user_email)
+    except Exception as e:
+        logger.debug(f"Could not read KG write sentinel for {user_email}: {e}")
+        sentinel = None
+    
+    if cached and sentinel is not None and cached[1] == sentinel:
+        # Expired but unchanged since it was computed; extend it
+        _financial_summaries[user_email] = (now + FINANCIAL_SUMMARY_TTL_SECONDS, sentinel, cached[2])
+        _financial_summaries.move_to_end(user_email)
+        return cached[2]
+    
+    try:
+        summary = await _load_user_financial_data(user_email)
     except Exception as e:
+        # Failed loads aren't cached so the next turn retries
         logger.error(f"❌ Error fetching financial data for {user_email}: {e}")
         return {
             'user_id': user_email,
@@ -168,82 +292,263 @@ async def get_user_financial_data(user_email: str) -> Dict[str, Any]:
             'transactions': [],
             'categories': {}
         }
+    
+    _financial_summaries[user_email] = (now + FINANCIAL_SUMMARY_TTL_SECONDS, sentinel, summary)
+    _financial_summaries.move_to_end(user_email)
+    while len(_financial_summaries) > FINANCIAL_SUMMARY_CACHE_SIZE:
+        _financial_summaries.popitem(last=False)
+    
+    return summary
 
 
-def categorize_transaction(merchant_name: str) -> str:
-    """Categorize transaction based on merchant name."""
-    merchant_lower = merchant_name.lower()
+async def _load_user_financial_data(user_email: str) -> Dict[str, Any]:
+    """Fetch user's financial data from Firestore using the user's email address; errors propagate."""
+    logger.info(f"🔍 Fetching financial data for user email: {user_email}")
+    
+    logger.info(f"🔄 Using email directly as document path: {user_email}")
+    
+    # Access user's knowledge graphs collection using email as document path
+    kg_collection_ref = firestore_service.db.collection('users').document(user_email).collection('knowledge_graphs')
     
-    # Food & Dining
-    food_keywords = ['restaurant', 'cafe', 'coffee', 'pizza', 'burger', 'food', 'dining', 'starbucks', 'mcdonald', 'kfc', 'domino', 'subway']
-    if any(keyword in merchant_lower for keyword in food_keywords):
-        return 'Food & Dining'
+    # Totals are aggregated server-side over the full history; only the recent
+    # transactions shown to the assistant are fetched as documents
+    totals_query = kg_collection_ref.where(filter=FieldFilter('data.total_amount', '>', 0))\
+        .sum('data.total_amount', alias='total_spent').count(alias='transaction_count')
+    recent_query = kg_collection_ref.order_by('data.created_at', direction=Query.DESCENDING)\
+        .limit(RECENT_TRANSACTION_LIMIT).select(_TRANSACTION_FIELDS)
     
-    # Groceries & Supermarkets
-    grocery_keywords = ['supermarket', 'grocery', 'market', 'mart', 'store', 'bigbasket', 'grofers', 'amazon fresh', 'walmart']
-    if any(keyword in merchant_lower for keyword in grocery_keywords):
-        return 'Groceries'
+    aggregates, recent_docs = await asyncio.gather(
+        asyncio.to_thread(totals_query.get),
+        asyncio.to_thread(lambda: list(recent_query.stream()))
+    )
+    totals = {result.alias: result.value for result in aggregates[0]}
+    total_spent = float(totals.get('total_spent') or 0.0)
+    transaction_count = int(totals.get('transaction_count') or 0)
     
-    # Transportation
-    transport_keywords = ['uber', 'lyft', 'taxi', 'bus', 'metro', 'train', 'fuel', 'gas', 'petrol', 'transport']
-    if any(keyword in merchant_lower for keyword in transport_keywords):
-        return 'Transportation'
+    # Process recent transactions; categories cover this recent window
+    transactions = []
+    categories = {}
     
-    # Shopping & Retail
-    shopping_keywords = ['mall', 'shopping', 'retail', 'amazon', 'flipkart', 'myntra', 'ajio', 'fashion']
-    if any(keyword in merchant_lower for keyword in shopping_keywords):
-        return 'Shopping'
+    for doc in recent_docs:
+        doc_data = doc.to_dict()
+        
+        # Extract financial information from document
+        if doc_data and 'data' in doc_data:
+            data = doc_data['data']
+            
+            # Get transaction amount; Firestore already decodes numbers, and non-numeric
+            # amounts are skipped just as the sum aggregation skips them
+            amount = data.get('total_amount') or 0.0
+            if not isinstance(amount, (int, float)):
+                continue
+            merchant = data.get('receipt_name', 'Unknown Merchant')
+            # Always present: the recent query orders by created_at, which skips docs without it
+            date = data.get('created_at')
+            
+            if amount > 0 and date:  # Only include valid transactions
+                # Categorize transaction
+                category = categorize_transaction(merchant)
+                categories[category] = categories.get(category, 0) + amount
+                
+                transactions.append({
+                    'id': doc.id,
+                    'amount': amount,
+                    'merchant': merchant,
+                    'date': date,
+                    'category': category
+                })
+                
+                # Positional args so the message is only formatted when debug logging is on
+                logger.debug("📄 Found transaction: %s - ₹%s", merchant, amount)
     
-    # Entertainment
-    entertainment_keywords = ['movie', 'cinema', 'theater', 'netflix', 'spotify', 'entertainment', 'game']
-    if any(keyword in merchant_lower for keyword in entertainment_keywords):
-        return 'Entertainment'
+    # Log summary
+    logger.info(f"📊 Summary for {user_email}: ₹{total_spent} total, {transaction_count} transactions")
+    
+    return {
+        'user_id': user_email,  # Return the email
+        'total_spent': total_spent,
+        'transaction_count': transaction_count,
+        'transactions': transactions,
+        'categories': categories
+    }
+
+
+# Merchant keywords per category, in match priority order
+_CATEGORY_KEYWORDS = (
+    ('Food & Dining', ['restaurant', 'cafe', 'coffee', 'pizza', 'burger', 'food', 'dining', 'starbucks', 'mcdonald', 'kfc', 'domino', 'subway']),
+    ('Groceries', ['supermarket', 'grocery', 'market', 'mart', 'store', 'bigbasket', 'grofers', 'amazon fresh', 'walmart']),
+    ('Transportation', ['uber', 'lyft', 'taxi', 'bus', 'metro', 'train', 'fuel', 'gas', 'petrol', 'transport']),
+    ('Shopping', ['mall', 'shopping', 'retail', 'amazon', 'flipkart', 'myntra', 'ajio', 'fashion']),
+    ('Entertainment', ['movie', 'cinema', 'theater', 'netflix', 'spotify', 'entertainment', 'game']),
+)
+_KEYWORD_RANK = {}
+for _rank, (_, _keywords) in enumerate(_CATEGORY_KEYWORDS):
+    for _keyword in _keywords:
+        _KEYWORD_RANK.setdefault(_keyword, _rank)
+
+# All keywords in one automaton. The zero-width lookahead reports a match at every
+# position, and alternatives are tried in priority order, so the best rank over all
+# matches is exactly what the category-by-category scans would have returned.
+_KEYWORD_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(keyword) for keyword in sorted(_KEYWORD_RANK, key=_KEYWORD_RANK.get)) + '))'
+)
+
+
+def categorize_transaction(merchant_name: str) -> str:
+    """Categorize transaction based on merchant name."""
+    # receipt_name may be stored as null
+    return _categorize_lower((merchant_name or '').lower())
+
+
+@lru_cache(maxsize=4096)
+def _categorize_lower(merchant_name: str) -> str:
+    """Category for an already-lowercased merchant name; memoized since users repeat merchants."""
+    best_rank = len(_CATEGORY_KEYWORDS)
+    for match in _KEYWORD_PATTERN.finditer(merchant_name):
+        best_rank = min(best_rank, _KEYWORD_RANK[match.group(1)])
+        if best_rank == 0:
+            break
+    
+    if best_rank < len(_CATEGORY_KEYWORDS):
+        return _CATEGORY_KEYWORDS[best_rank][0]
     
     # Default category
     return 'Other'
 
 
+# Invariant instructions lead the prompt so every request shares a byte-identical
+# prefix that Gemini's implicit prompt cache can reuse
+_FINANCIAL_PROMPT_PREFIX = sys.intern("""You are Economix, an AI financial assistant. You are given the user's financial data followed by their question.
+
+Based on this financial data, please:
+1. Answer the user's specific question accurately
+2. Provide relevant financial insights or recommendations  
+3. Provide helpful insights based on their real spending
+4. Be conversational and helpful
+5. If they have no data, encourage them to start tracking expenses
+
+Please provide a helpful response using their actual financial information.
+""")
+
+_FINANCIAL_PROMPT_TEMPLATE = _FINANCIAL_PROMPT_PREFIX + """
+USER FINANCIAL DATA FOR {user_id}:
+- Total Spent: ₹{total_spent:.2f}
+- Number of Transactions: {transaction_count}
+
+SPENDING BY CATEGORY (RECENT TRANSACTIONS):
+{category_breakdown}
+
+RECENT TRANSACTIONS:
+{transaction_details}
+
+The user has asked: "{user_message}\""""
+
+# Tie-break order for categories with equal spend, so the breakdown renders
+# identically for identical data
+_CATEGORY_ORDER = {category: i for i, category in enumerate(
+    tuple(category for category, _ in _CATEGORY_KEYWORDS) + ('Other',)
+)}
+
+
 def create_financial_prompt(financial_data: Dict[str, Any], user_message: str) -> str:
     """Create a comprehensive prompt for Gemini AI with user's financial data."""
-    user_id = financial_data.get('user_id', 'Unknown')
-    total_spent = financial_data.get('total_spent', 0)
-    transaction_count = financial_data.get('transaction_count', 0)
     transactions = financial_data.get('transactions', [])
     categories = financial_data.get('categories', {})
     
     # Build transaction details
-    transaction_details = ""
-    for i, transaction in enumerate(transactions[:10], 1):  # Show up to 10 recent transactions
-        transaction_details += f"{i}. {transaction['merchant']} - ₹{transaction['amount']} ({transaction['category']}) on {transaction['date'][:10]}\n"
+    transaction_details = "".join(
+        f"{i}. {transaction['merchant']} - ₹{transaction['amount']} ({transaction['category']}) on {transaction['date'][:10]}\n"
+        for i, transaction in enumerate(transactions[:RECENT_TRANSACTION_LIMIT], 1)  # Show the recent transactions
+    )
     
-    # Build category breakdown
-    category_breakdown = ""
-    for category, amount in categories.items():
-        percentage = (amount / total_spent * 100) if total_spent > 0 else 0
-        category_breakdown += f"- {category}: ₹{amount:.2f} ({percentage:.1f}%)\n"
+    # Build category breakdown; categories cover the recent transactions only
+    # Highest spend first, so the assistant sees the strongest signal up front
+    recent_spent = sum(categories.values())
+    percent_per_rupee = 100.0 / recent_spent if recent_spent > 0 else 0.0
+    ranked = sorted(categories.items(), key=lambda item: (-item[1], _CATEGORY_ORDER.get(item[0], len(_CATEGORY_ORDER))))
+    category_breakdown = "".join(
+        f"- {category}: ₹{amount:.2f} ({amount * percent_per_rupee:.1f}%)\n"
+        for category, amount in ranked
+    )
     
-    prompt = f"""You are Economix, an AI financial assistant. The user has asked: "{user_message}"
+    return _FINANCIAL_PROMPT_TEMPLATE.format_map({
+        'user_message': user_message,
+        'user_id': financial_data.get('user_id', 'Unknown'),
+        'total_spent': financial_data.get('total_spent', 0),
+        'transaction_count': financial_data.get('transaction_count', 0),
+        'category_breakdown': category_breakdown,
+        'transaction_details': transaction_details
+    })
 
-USER FINANCIAL DATA FOR {user_id}:
-- Total Spent: ₹{total_spent:.2f}
-- Number of Transactions: {transaction_count}
 
-SPENDING BY CATEGORY:
-{category_breakdown}
+# Bound on concurrent Gemini generations from this process, so bursts queue here
+# instead of tripping quota errors
+_gemini_slots = asyncio.Semaphore(settings.gemini_max_concurrency)
 
-RECENT TRANSACTIONS:
-{transaction_details}
+# Chat responses per prompt: prompt digest -> (expires_at, response). The prompt
+# embeds the user's financial data, so a hit means same question over same data.
+CHAT_RESPONSE_TTL_SECONDS = 300
+CHAT_RESPONSE_CACHE_SIZE = 10_000
+_chat_responses: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+
+
+async def _generate_chat_response(prompt: str) -> str:
+    """Gemini response for a chat prompt, reused for repeat prompts within the TTL."""
+    key = hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+    cached = _chat_responses.get(key)
+    if cached and cached[0] > time.monotonic():
+        _chat_responses.move_to_end(key)
+        return cached[1]
+    
+    async with _gemini_slots:
+        response = await gemini_service.generate_text_response(prompt=prompt, context=[])
+    
+    # Failures come back as the fallback text; don't pin that for the TTL
+    if response != FALLBACK_RESPONSE:
+        _chat_responses[key] = (time.monotonic() + CHAT_RESPONSE_TTL_SECONDS, response)
+        _chat_responses.move_to_end(key)
+        while len(_chat_responses) > CHAT_RESPONSE_CACHE_SIZE:
+            _chat_responses.popitem(last=False)
+    return response
 
-Based on this financial data, please:
-1. Answer the user's specific question accurately
-2. Provide relevant financial insights or recommendations  
-3. Provide helpful insights based on their real spending
-4. Be conversational and helpful
-5. If they have no data, encourage them to start tracking expenses
 
-Please provide a helpful response using their actual financial information."""
+async def _read_chat_inputs(request: Request, user_email: Optional[str], message: Optional[str],
+                            message_type: str) -> Tuple[str, str, str]:
+    """Resolve chat inputs from form fields or a JSON body; 400 if user_email or message is missing."""
+    # Handle both JSON and form data; only JSON requests are re-read as a JSON body
+    is_json = request.headers.get('content-type', '').startswith('application/json')
+    if is_json and (user_email is None or message is None):
+        try:
+            body = await request.json()
+            user_email = body.get("user_email") or body.get("user_id")  # Support both for transition
+            message = body.get("message")
+            message_type = body.get("message_type", "text")
+        except Exception:
+            pass
     
-    return prompt
+    logger.info(f"🔍 ECONOMIX CHAT: user_email='{user_email}', message='{message}', type={message_type}")
+    
+    if not message or not user_email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="user_email and message are required"
+        )
+    
+    return user_email, message, message_type
+
+
+def _auth_failure_response(user_email: str) -> ORJSONResponse:
+    """401 response for a chat request whose user email is malformed."""
+    logger.error(f"🚨 Authentication failed for user: {user_email}")
+    return ORJSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={
+            "success": False,
+            "error": "User authentication failed",
+            "message": "Please ensure you are logged in with a valid email address",
+            "details": f"Invalid email format: {user_email}"
+        }
+    )
 
 
 @router.post("/chat")
@@ -258,41 +563,16 @@ async def chat_with_economix(
     Expects user_email (logged-in user's email) instead of Firebase UID.
     """
     try:
-        # Handle both JSON and form data
-        if user_email is None or message is None:
-            try:
-                body = await request.json()
-                user_email = body.get("user_email") or body.get("user_id")  # Support both for transition
-                message = body.get("message")
-                message_type = body.get("message_type", "text")
-            except Exception:
-                pass
+        user_email, message, message_type = await _read_chat_inputs(request, user_email, message, message_type)
         
-        logger.info(f"🔍 ECONOMIX CHAT: user_email='{user_email}', message='{message}', type={message_type}")
-        
-        if not message or not user_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="user_email and message are required"
-            )
+        # Reject malformed emails before touching Firestore
+        if not _valid_email(user_email):
+            return _auth_failure_response(user_email)
         
         # Get user's actual financial data using their logged-in email
         logger.info(f"📧 Fetching data for user email: {user_email}")
         user_financial_data = await get_user_financial_data(user_email)
         
-        # Check if user authentication was successful
-        if user_financial_data.get('error'):
-            logger.error(f"🚨 Authentication failed for user: {user_email}")
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={
-                    "success": False,
-                    "error": "User authentication failed",
-                    "message": "Please ensure you are logged in with a valid email address",
-                    "details": user_financial_data.get('error')
-                }
-            )
-        
         # Log what we found
         total_spent = user_financial_data.get('total_spent', 0)
         transaction_count = user_financial_data.get('transaction_count', 0)
@@ -303,12 +583,9 @@ async def chat_with_economix(
         ai_prompt = create_financial_prompt(user_financial_data, message)
         
         # Get AI response
-        response = await gemini_service.generate_text_response(
-            prompt=ai_prompt,
-            context=[]
-        )
+        response = await _generate_chat_response(ai_prompt)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": True,
                 "response": response,
@@ -326,7 +603,7 @@ async def chat_with_economix(
         raise
     except Exception as e:
         logger.error(f"❌ Error in chat endpoint: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "success": False,
@@ -336,21 +613,114 @@ async def chat_with_economix(
         )
 
 
+async def _pump_gemini_stream(prompt: str, queue: asyncio.Queue) -> None:
+    """
+    Read a whole Gemini stream into the queue, then a None end marker. A Gemini slot is
+    held only while generating, not while a slow client drains the queue; a failure is
+    queued as the exception itself.
+    """
+    try:
+        async with _gemini_slots:
+            async for chunk in gemini_service.stream_text_response(prompt):
+                queue.put_nowait(chunk)
+    except Exception as e:
+        queue.put_nowait(e)
+    queue.put_nowait(None)
+
+
+@router.post("/chat/stream")
+async def stream_chat_with_economix(
+    request: Request,
+    user_email: str = Form(None),
+    message: str = Form(None),
+    message_type: str = Form(default="text")
+):
+    """
+    Streaming variant of /chat. Returns Server-Sent Events: a data event per chunk of
+    the response text as Gemini generates it, then a final "done" event carrying the
+    financial summary.
+    """
+    user_email, message, message_type = await _read_chat_inputs(request, user_email, message, message_type)
+    
+    # Reject malformed emails before touching Firestore
+    if not _valid_email(user_email):
+        return _auth_failure_response(user_email)
+    
+    user_financial_data = await get_user_financial_data(user_email)
+    
+    async def _events():
+        # Headers are already sent once this runs, so failures are reported in-stream
+        success = True
+        queue = asyncio.Queue()  # Bounded in practice by Gemini's max_output_tokens
+        pump = None
+        try:
+            ai_prompt = create_financial_prompt(user_financial_data, message)
+            pump = asyncio.create_task(_pump_gemini_stream(ai_prompt, queue))
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield f"data: {orjson.dumps({'text': chunk}).decode()}\n\n"
+        except Exception as e:
+            logger.error(f"❌ Error in chat stream: {e}")
+            success = False
+            error = {"error": "Failed to process message", "details": str(e)}
+            yield f"event: error\ndata: {orjson.dumps(error).decode()}\n\n"
+        finally:
+            # Client disconnects close the generator; stop generating for nobody
+            if pump is not None:
+                pump.cancel()
+        
+        done = {
+            "success": success,
+            "message_type": message_type,
+            "timestamp": datetime.now().isoformat(),
+            "user_id": user_email,
+            "financial_summary": {
+                "total_spent": user_financial_data.get('total_spent', 0),
+                "transaction_count": user_financial_data.get('transaction_count', 0)
+            }
+        }
+        yield f"event: done\ndata: {orjson.dumps(done).decode()}\n\n"
+    
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
 # Debug endpoints for testing
+
+# /debug/list-users responses are reused for this long
+DEBUG_LIST_USERS_TTL_SECONDS = 30
+_debug_list_users_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+
+def _etag_response(request: Request, content: Dict[str, Any]) -> Response:
+    """JSON response tagged with a content ETag; 304 when the client already has it."""
+    response = ORJSONResponse(content=content)
+    etag = f'"{hashlib.blake2b(response.body, digest_size=8).hexdigest()}"'
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return response
+
+
 @router.get("/debug/user-data/{user_email}")
-async def debug_user_data(user_email: str):
+async def debug_user_data(user_email: str, request: Request):
     """Debug endpoint to check user's financial data by email"""
     try:
         logger.info(f"🔍 DEBUG: Fetching data for user: {user_email}")
+        if not _valid_email(user_email):
+            return ORJSONResponse(
+                status_code=400,
+                content={"success": False, "error": f"Invalid email format: {user_email}"}
+            )
         data = await get_user_financial_data(user_email)
-        return JSONResponse(content={
+        return _etag_response(request, {
             "success": True,
             "user_email": user_email,
             "data": data
         })
     except Exception as e:
         logger.error(f"❌ DEBUG ERROR: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
         )
@@ -366,7 +736,7 @@ async def debug_test_auth(user_id: str = Form(...)):
         email = await get_user_email_from_uid(user_id)
         
         if email is None:
-            return JSONResponse(content={
+            return ORJSONResponse(content={
                 "success": False,
                 "step": "UID to email conversion",
                 "error": f"Could not find email for UID: {user_id}",
@@ -374,10 +744,11 @@ async def debug_test_auth(user_id: str = Form(...)):
             })
         
         # Step 2: Check if user has knowledge graphs
-        kg_collection = firestore_service.db.collection('users').document(email).collection('knowledge_graphs')
-        kg_docs = list(kg_collection.limit(5).stream())
+        kg_collection = firestore_service.async_db.collection('users').document(email).collection('knowledge_graphs')
+        # Project to the document name only; an empty projection would return every field
+        kg_docs = [doc async for doc in kg_collection.select([FieldPath.document_id()]).limit(5).stream()]
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "success": True,
             "original_uid": user_id,
             "converted_email": email,
@@ -387,42 +758,53 @@ async def debug_test_auth(user_id: str = Form(...)):
         
     except Exception as e:
         logger.error(f"❌ DEBUG AUTH ERROR: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
         )
 
 
 @router.get("/debug/list-users")
-async def debug_list_users():
+async def debug_list_users(request: Request):
     """Debug endpoint to list all users in Firestore"""
+    global _debug_list_users_cache
     try:
-        users_collection = firestore_service.db.collection('users')
-        users = users_collection.limit(20).stream()
+        now = time.monotonic()
+        if _debug_list_users_cache and _debug_list_users_cache[0] > now:
+            return _etag_response(request, _debug_list_users_cache[1])
+        
+        users_collection = firestore_service.async_db.collection('users')
+        users = [user async for user in users_collection.limit(20).stream()]
+        
+        async def _count_knowledge_graphs(user_id: str) -> int:
+            kg_collection = firestore_service.async_db.collection('users').document(user_id).collection('knowledge_graphs')
+            # Server-side count; no documents are transferred
+            result = await kg_collection.count(alias='count').get()
+            return result[0][0].value
+        
+        # Count knowledge graphs for each user concurrently
+        kg_counts = await asyncio.gather(*[_count_knowledge_graphs(user.id) for user in users])
         
         user_list = []
-        for user in users:
-            user_data = user.to_dict()
-            
-            # Count knowledge graphs for each user
-            kg_collection = firestore_service.db.collection('users').document(user.id).collection('knowledge_graphs')
-            kg_count = len(list(kg_collection.limit(100).stream()))
-            
+        for user, kg_count in zip(users, kg_counts):
             user_list.append({
                 "user_id": user.id,
-                "user_data": user_data,
+                # Firestore timestamps (e.g. last_kg_write_ts) aren't natively JSON-serializable
+                "user_data": jsonable_encoder(user.to_dict()),
                 "knowledge_graphs_count": kg_count
             })
         
-        return JSONResponse(content={
+        content = {
             "success": True,
             "total_users": len(user_list),
             "users": user_list
-        })
+        }
+        _debug_list_users_cache = (now + DEBUG_LIST_USERS_TTL_SECONDS, content)
+        return _etag_response(request, content)
         
     except Exception as e:
         logger.error(f"❌ DEBUG LIST USERS ERROR: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
         )
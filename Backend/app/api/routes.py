@@ -6,7 +6,7 @@ from datetime import date, datetime
 
 from ..services.document_ai import DocumentAIService
 from ..services.firestore_service import FirestoreService
-from ..agents.graph_builder import graph_builder_agent
+from ..agents.graph_builder import graph_builder_agent, GraphLoader
 from ..models.receipt import Receipt, ReceiptSearchQuery, ReceiptSummary
 from ..models.knowledge_graph import KnowledgeGraph, GraphAnalytics
 from ..utils.logging import get_logger
@@ -36,6 +36,11 @@ def get_firestore_service():
     return firestore_service
 
 
+def get_graph_loader() -> GraphLoader:
+    """Create a knowledge graph loader scoped to the current request."""
+    return graph_builder_agent.create_graph_loader()
+
+
 @router.post("/receipts/upload", response_model=Receipt)
 async def upload_receipt(
     file: UploadFile = File(...),
@@ -386,13 +391,17 @@ async def get_user_knowledge_graph(user_id: str):
 
 
 @router.post("/graphs/merge")
-async def merge_knowledge_graphs(graph_ids: List[str], user_id: str = Query(...)):
+async def merge_knowledge_graphs(
+    graph_ids: List[str],
+    user_id: str = Query(...),
+    loader: GraphLoader = Depends(get_graph_loader)
+):
     """Merge multiple knowledge graphs into one."""
     try:
         if len(graph_ids) < 2:
             raise HTTPException(status_code=400, detail="At least 2 graph IDs required for merging")
         
-        merged_graph = await graph_builder_agent.merge_graphs(graph_ids, user_id)
+        merged_graph = await graph_builder_agent.merge_graphs(graph_ids, user_id, loader=loader)
         
         return {
             "success": True,
@@ -411,10 +420,10 @@ async def merge_knowledge_graphs(graph_ids: List[str], user_id: str = Query(...)
 
 
 @router.get("/graphs/{graph_id}/analytics")
-async def get_graph_analytics(graph_id: str):
+async def get_graph_analytics(graph_id: str, loader: GraphLoader = Depends(get_graph_loader)):
     """Get analytics and insights for a knowledge graph."""
     try:
-        analytics = await graph_builder_agent.analyze_graph(graph_id)
+        analytics = await graph_builder_agent.analyze_graph(graph_id, loader=loader)
         
         return {
             "success": True,
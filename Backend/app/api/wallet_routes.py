@@ -2,6 +2,8 @@
 Google Wallet API routes for pass generation and management.
 """
 
+from typing import List
+
 from fastapi import APIRouter, HTTPException, status
 from fastapi.responses import JSONResponse
 
@@ -106,6 +108,43 @@ async def generate_wallet_pass(request: PassGenerationRequest):
         )
 
 
+@router.post("/generate-passes", response_model=List[PassGenerationResponse])
+async def generate_wallet_passes(requests: List[PassGenerationRequest]):
+    """
+    Generate signed JWT tokens for several wallet items in one call.
+    
+    Args:
+        requests: Pass generation requests, one per item
+        
+    Returns:
+        PassGenerationResponse per request, in request order
+    """
+    try:
+        logger.info(f"Generating {len(requests)} wallet passes")
+        
+        if not requests:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="At least one pass generation request is required"
+            )
+        
+        responses = await pass_generator.generate_wallet_passes(requests)
+        
+        succeeded = sum(1 for response in responses if response.success)
+        logger.info(f"Generated {succeeded}/{len(responses)} wallet passes")
+        
+        return responses
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating wallet passes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate wallet passes: {str(e)}"
+        )
+
+
 @router.get("/pass-status/{pass_id}")
 async def get_pass_status(pass_id: str):
     """
@@ -3,8 +3,8 @@ Knowledge Graph models for entity-relation representation.
 """
 
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
 import uuid
 
 
@@ -62,18 +62,67 @@ class KnowledgeGraph(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
-    def add_entity(self, entity: GraphEntity) -> None:
+    # Dedup indexes used by add_or_merge_entity / add_or_merge_relation. They cover
+    # everything added through add_entity / add_relation, not entities or relations
+    # passed to the constructor.
+    _entity_index: Dict[Tuple[str, str], GraphEntity] = PrivateAttr(default_factory=dict)
+    _relation_index: Dict[Tuple[str, str, str], GraphRelation] = PrivateAttr(default_factory=dict)
+    
+    def add_entity(self, entity: GraphEntity, key: Optional[Tuple[str, str]] = None) -> None:
         """Add an entity to the graph."""
+        if key is None:
+            key = (entity.name.lower(), entity.type)
+        self._entity_index.setdefault(key, entity)
         self.entities.append(entity)
         self.total_entities = len(self.entities)
         self.updated_at = datetime.utcnow()
     
     def add_relation(self, relation: GraphRelation) -> None:
         """Add a relation to the graph."""
+        key = (relation.source_entity_id, relation.target_entity_id, relation.relation_type)
+        self._relation_index.setdefault(key, relation)
         self.relations.append(relation)
         self.total_relations = len(self.relations)
         self.updated_at = datetime.utcnow()
     
+    def add_or_merge_entity(self, entity: GraphEntity, key: Optional[Tuple[str, str]] = None) -> bool:
+        """
+        Add an entity, or merge it into an existing one with the same (lowercased name, type).
+        
+        Returns True if the entity was added, False if it was merged.
+        """
+        if key is None:
+            key = (entity.name.lower(), entity.type)
+        existing = self._entity_index.get(key)
+        if existing is None:
+            self.add_entity(entity, key)
+            return True
+        
+        # Merge attributes (writing only changed values) and update confidence
+        if entity.attributes is not existing.attributes:
+            existing_attributes = existing.attributes
+            for attr, value in entity.attributes.items():
+                if attr not in existing_attributes or existing_attributes[attr] != value:
+                    existing_attributes[attr] = value
+        existing.confidence = max(existing.confidence, entity.confidence)
+        return False
+    
+    def add_or_merge_relation(self, relation: GraphRelation) -> bool:
+        """
+        Add a relation, or strengthen an existing one with the same (source, target, type).
+        
+        Returns True if the relation was added, False if it was merged.
+        """
+        key = (relation.source_entity_id, relation.target_entity_id, relation.relation_type)
+        existing = self._relation_index.get(key)
+        if existing is None:
+            self.add_relation(relation)
+            return True
+        
+        # Strengthen existing relation
+        existing.weight = min(existing.weight + 0.1, 1.0)
+        return False
+    
     def get_entity_by_id(self, entity_id: str) -> Optional[GraphEntity]:
         """Get entity by ID."""
         return next((e for e in self.entities if e.id == entity_id), None)
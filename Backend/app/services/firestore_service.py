@@ -1,7 +1,7 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, date
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 from google.cloud.firestore_v1 import FieldFilter, Query
 
 from ..models.receipt import Receipt, ReceiptSearchQuery, ReceiptSummary
@@ -10,12 +10,16 @@ from ..utils.config import settings
 from ..utils.credentials_manager import credentials_manager
 from ..utils.logging import get_logger, LoggerMixin
 
+# Firestore limit on operations per write batch
+MAX_BATCH_WRITES = 500
+
 
 class FirestoreService(LoggerMixin):
     """Service for managing Firestore operations including knowledge graphs."""
     
     def __init__(self):
         self.db = None
+        self.async_db = None
         self._initialize_firestore()
         
     def _initialize_firestore(self):
@@ -54,8 +58,9 @@ class FirestoreService(LoggerMixin):
                         self.logger.info("Using default Firebase authentication")
                         firebase_admin.initialize_app()
             
-            # Initialize Firestore client
+            # Initialize Firestore clients; async_db is for callers running on the event loop
             self.db = firestore.client()
+            self.async_db = firestore_async.client()
             self.logger.info("Firestore service initialized")
             
         except Exception as e:
@@ -352,15 +357,13 @@ class FirestoreService(LoggerMixin):
             self.log_operation("bulk_update_receipts", count=len(receipts))
             
             # Use batch writes for efficiency
-            batch = self.db.batch()
-            
+            writes = []
             for receipt in receipts:
                 receipt.updated_at = datetime.utcnow()
                 doc_ref = self.db.collection('receipts').document(receipt.id)
-                batch.set(doc_ref, receipt.to_dict(), merge=True)
+                writes.append((doc_ref, receipt.to_dict(), True))
             
-            # Commit batch
-            batch.commit()
+            self._commit_in_batches(writes)
             
             self.log_operation("bulk_update_receipts_completed", count=len(receipts))
             return len(receipts)
@@ -399,11 +402,15 @@ class FirestoreService(LoggerMixin):
             
             # Save to daily_receipts collection as shown in screenshot: daily_receipts -> {date} -> {receipt_id}
             daily_receipt_ref = self.db.collection('daily_receipts').document(daily_date).collection('receipts').document(receipt_id)
-            daily_receipt_ref.set(comprehensive_data)
             
             # Also save to main comprehensive receipts collection for backward compatibility
             receipts_ref = self.db.collection('comprehensive_receipts').document(receipt_id)
-            receipts_ref.set(comprehensive_data)
+            
+            # Both copies are written atomically in a single commit
+            self._commit_in_batches([
+                (daily_receipt_ref, comprehensive_data, False),
+                (receipts_ref, comprehensive_data, False)
+            ])
             
             self.log_operation("save_comprehensive_knowledge_graph_completed", receipt_id=receipt_id)
             return receipt_id
@@ -774,6 +781,14 @@ class FirestoreService(LoggerMixin):
             created_at=data.get('created_at')
         )
     
+    def _commit_in_batches(self, writes: List[Tuple[Any, Dict[str, Any], bool]]) -> None:
+        """Commit (doc_ref, data, merge) set operations using write batches of at most 500 operations."""
+        for start in range(0, len(writes), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for doc_ref, data, merge in writes[start:start + MAX_BATCH_WRITES]:
+                batch.set(doc_ref, data, merge=merge)
+            batch.commit()
+    
     async def _update_user_graph_count(self, user_id: str):
         """Update user's graph count in their profile."""
         try:
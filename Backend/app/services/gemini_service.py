@@ -5,13 +5,16 @@ Handles AI interactions using Google's Gemini API
 import os
 import json
 import logging
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 from ..utils.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Returned in place of a generated response when a Gemini call fails
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again."
+
 class GeminiService:
     """Service for interacting with Google's Gemini AI"""
     
@@ -71,12 +74,33 @@ class GeminiService:
                 # Mock response for development
                 return self._generate_mock_response(prompt)
             
-            response = self.model.generate_content(full_prompt)
+            response = await self.model.generate_content_async(full_prompt)
             return response.text
             
         except Exception as e:
             logger.error(f"Error generating text response: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again."
+            return FALLBACK_RESPONSE
+    
+    async def stream_text_response(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a text response from Gemini chunk by chunk as it is generated.
+        
+        Unlike generate_text_response, errors propagate: chunks may already have been
+        sent, so the caller decides how to report a failure mid-stream.
+        """
+        if self.api_key == "placeholder_key":
+            # Mock response for development
+            yield self._generate_mock_response(prompt)
+            return
+        
+        try:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            logger.error(f"Error streaming text response: {e}")
+            raise
     
     async def analyze_image(
         self, 
@@ -7,6 +7,7 @@ import json
 import requests
 from typing import Dict, Any
 import jwt
+from cryptography.hazmat.primitives import serialization
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 
@@ -32,6 +33,8 @@ class GoogleWalletService(LoggerMixin):
         with open(self.service_account_file, 'r') as f:
             self.service_account_info = json.load(f)
         self.private_key = self.service_account_info['private_key']
+        # Parse the PEM once; passing the key object spares jwt.encode a reload per signature
+        self.signing_key = serialization.load_pem_private_key(self.private_key.encode('utf-8'), password=None)
         self.service_account_email = self.service_account_info['client_email']
         
         # Pass class IDs
@@ -278,7 +281,7 @@ class GoogleWalletService(LoggerMixin):
             # Sign the JWT with the private key
             token = jwt.encode(
                 payload_dict,
-                self.private_key,
+                self.signing_key,
                 algorithm="RS256",
                 headers={"alg": "RS256", "typ": "JWT"}
             )
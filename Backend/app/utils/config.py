@@ -19,6 +19,7 @@ class Settings(BaseSettings):
     
     # Gemini API Configuration
     gemini_api_key: str = Field(..., env="GEMINI_API_KEY")
+    gemini_max_concurrency: int = Field(default=8, env="GEMINI_MAX_CONCURRENCY")  # In-flight Gemini calls per process
     
     # Firestore Configuration
     firestore_database_id: str = Field(default="(default)", env="FIRESTORE_DATABASE_ID")
@@ -32,6 +33,7 @@ class Settings(BaseSettings):
     api_host: str = Field(default="0.0.0.0", env="API_HOST")
     api_port: int = Field(default=8080, env="API_PORT")  # Changed default to 8080 for Cloud Run
     debug: bool = Field(default=False, env="DEBUG")
+    debug_kg_probes: bool = Field(default=False, env="DEBUG_KG_PROBES")  # Probe alternative user IDs when a KG lookup is empty
     
     # CORS Configuration
     allowed_origins: list[str] = Field(
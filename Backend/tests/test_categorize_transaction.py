@@ -0,0 +1,67 @@
+"""
+Tests for merchant categorization in the Economix bot routes.
+"""
+
+import itertools
+
+import pytest
+
+try:
+    from app.api import economix_bot_routes as routes
+except Exception as e:  # Needs the backend dependencies, .env settings and Firebase credentials
+    pytest.skip(f"economix_bot_routes unavailable: {e}", allow_module_level=True)
+
+
+def _sequential_category(merchant_name: str) -> str:
+    """Category-by-category keyword scan the single-pass pattern replaces."""
+    merchant_lower = merchant_name.lower()
+    for category, keywords in routes._CATEGORY_KEYWORDS:
+        if any(keyword in merchant_lower for keyword in keywords):
+            return category
+    return 'Other'
+
+
+@pytest.mark.parametrize("merchant_name, expected", [
+    ("Starbucks Coffee", 'Food & Dining'),
+    ("BigBasket", 'Groceries'),
+    ("Uber Trip", 'Transportation'),
+    ("Flipkart", 'Shopping'),
+    ("PVR Cinema", 'Entertainment'),
+    ("Electricity Board", 'Other'),
+])
+def test_categorize_transaction_single_category(merchant_name, expected):
+    assert routes.categorize_transaction(merchant_name) == expected
+
+
+@pytest.mark.parametrize("merchant_name, expected", [
+    # Earlier categories win regardless of where their keyword appears
+    ("Shopping Mall Restaurant", 'Food & Dining'),
+    ("Metro Supermarket", 'Groceries'),
+    ("Fashion Bus Stop", 'Transportation'),
+    ("Netflix Fashion", 'Shopping'),
+    # A longer higher-priority keyword sharing a start with a lower-priority one
+    ("Amazon Fresh", 'Groceries'),
+    ("Amazon", 'Shopping'),
+    # Keywords match as substrings, as in the original scan
+    ("Walmart", 'Groceries'),
+    ("Las Vegas Gaming", 'Transportation'),
+])
+def test_categorize_transaction_keyword_priority(merchant_name, expected):
+    assert routes.categorize_transaction(merchant_name) == expected
+
+
+def test_categorize_transaction_is_case_insensitive():
+    assert routes.categorize_transaction("STARBUCKS") == 'Food & Dining'
+    assert routes.categorize_transaction("sPoTiFy") == 'Entertainment'
+
+
+@pytest.mark.parametrize("merchant_name", [None, ""])
+def test_categorize_transaction_missing_name(merchant_name):
+    assert routes.categorize_transaction(merchant_name) == 'Other'
+
+
+def test_categorize_transaction_matches_sequential_scan():
+    keywords = [keyword for _, category_keywords in routes._CATEGORY_KEYWORDS for keyword in category_keywords]
+    names = [" ".join(pair) for pair in itertools.permutations(keywords + ["acme"], 2)]
+    for name in names:
+        assert routes.categorize_transaction(name) == _sequential_category(name), name
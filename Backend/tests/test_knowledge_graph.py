@@ -0,0 +1,121 @@
+"""
+Tests for KnowledgeGraph entity/relation merge and dedup semantics.
+"""
+
+from app.models.knowledge_graph import KnowledgeGraph, GraphEntity, GraphRelation
+
+
+def _graph() -> KnowledgeGraph:
+    return KnowledgeGraph(name="test_graph")
+
+
+def test_add_or_merge_entity_adds_new_entity():
+    graph = _graph()
+    entity = GraphEntity(name="Milk", type="product")
+
+    assert graph.add_or_merge_entity(entity) is True
+    assert graph.entities == [entity]
+    assert graph.total_entities == 1
+
+
+def test_add_or_merge_entity_merges_case_insensitive_name_and_type():
+    graph = _graph()
+    first = GraphEntity(name="Milk", type="product", confidence=0.6, attributes={"price": 2.0, "unit": "l"})
+    second = GraphEntity(name="MILK", type="product", confidence=0.9, attributes={"price": 2.5, "brand": "Amul"})
+    graph.add_or_merge_entity(first)
+
+    assert graph.add_or_merge_entity(second) is False
+    assert graph.entities == [first]
+    assert graph.total_entities == 1
+    assert first.attributes == {"price": 2.5, "unit": "l", "brand": "Amul"}
+    assert first.confidence == 0.9
+
+
+def test_add_or_merge_entity_keeps_higher_existing_confidence():
+    graph = _graph()
+    first = GraphEntity(name="Milk", type="product", confidence=0.9)
+    graph.add_or_merge_entity(first)
+    graph.add_or_merge_entity(GraphEntity(name="milk", type="product", confidence=0.3))
+
+    assert first.confidence == 0.9
+
+
+def test_add_or_merge_entity_distinguishes_types():
+    graph = _graph()
+    graph.add_or_merge_entity(GraphEntity(name="Amul", type="brand"))
+
+    assert graph.add_or_merge_entity(GraphEntity(name="Amul", type="merchant")) is True
+    assert graph.total_entities == 2
+
+
+def test_add_or_merge_entity_uses_explicit_key():
+    graph = _graph()
+    first = GraphEntity(name="Store #1", type="merchant")
+    graph.add_or_merge_entity(first, key=("store", "merchant"))
+
+    assert graph.add_or_merge_entity(GraphEntity(name="Store #2", type="merchant"), key=("store", "merchant")) is False
+    assert graph.entities == [first]
+
+
+def test_add_or_merge_entity_merges_into_plain_added_entity():
+    graph = _graph()
+    first = GraphEntity(name="Bread", type="product", attributes={"price": 1.0})
+    graph.add_entity(first)
+
+    assert graph.add_or_merge_entity(GraphEntity(name="bread", type="product", attributes={"price": 1.2})) is False
+    assert graph.entities == [first]
+    assert first.attributes["price"] == 1.2
+
+
+def test_add_or_merge_relation_adds_new_relation():
+    graph = _graph()
+    relation = GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at", weight=0.5)
+
+    assert graph.add_or_merge_relation(relation) is True
+    assert graph.relations == [relation]
+    assert graph.total_relations == 1
+
+
+def test_add_or_merge_relation_strengthens_duplicate():
+    graph = _graph()
+    first = GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at", weight=0.5)
+    graph.add_or_merge_relation(first)
+
+    duplicate = GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at")
+    assert graph.add_or_merge_relation(duplicate) is False
+    assert graph.relations == [first]
+    assert graph.total_relations == 1
+    assert first.weight == 0.6
+
+
+def test_add_or_merge_relation_caps_weight_at_one():
+    graph = _graph()
+    first = GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at", weight=0.95)
+    graph.add_or_merge_relation(first)
+    graph.add_or_merge_relation(GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at"))
+
+    assert first.weight == 1.0
+
+
+def test_add_or_merge_relation_distinguishes_direction_and_type():
+    graph = _graph()
+    graph.add_or_merge_relation(GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at"))
+
+    assert graph.add_or_merge_relation(
+        GraphRelation(source_entity_id="b", target_entity_id="a", relation_type="purchased_at")
+    ) is True
+    assert graph.add_or_merge_relation(
+        GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="belongs_to")
+    ) is True
+    assert graph.total_relations == 3
+
+
+def test_add_or_merge_relation_merges_into_plain_added_relation():
+    graph = _graph()
+    first = GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at", weight=0.5)
+    graph.add_relation(first)
+
+    assert graph.add_or_merge_relation(
+        GraphRelation(source_entity_id="a", target_entity_id="b", relation_type="purchased_at")
+    ) is False
+    assert graph.relations == [first]
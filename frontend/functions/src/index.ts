@@ -9,7 +9,12 @@
 
 import {setGlobalOptions} from "firebase-functions";
 import {onRequest} from "firebase-functions/https";
+import {onDocumentWritten} from "firebase-functions/v2/firestore";
 import * as logger from "firebase-functions/logger";
+import {initializeApp} from "firebase-admin/app";
+import {FieldValue, getFirestore} from "firebase-admin/firestore";
+
+initializeApp();
 
 // Start writing functions
 // https://firebase.google.com/docs/functions/typescript
@@ -30,3 +35,26 @@ setGlobalOptions({ maxInstances: 10 });
 //   logger.info("Hello logs!", {structuredData: true});
 //   response.send("Hello from Firebase!");
 // });
+
+/**
+ * Stamps users/{userEmail}.last_kg_write_ts whenever one of the user's
+ * knowledge graphs is created, updated or deleted. The backend caches each
+ * user's financial summary and only recomputes it once this sentinel moves,
+ * so chat turns read this single field instead of the whole subcollection.
+ */
+export const stampKnowledgeGraphWrite = onDocumentWritten(
+  "users/{userEmail}/knowledge_graphs/{kgId}",
+  async (event) => {
+    const userRef = getFirestore()
+      .collection("users")
+      .doc(event.params.userEmail);
+    await userRef.set(
+      {last_kg_write_ts: FieldValue.serverTimestamp()},
+      {merge: true},
+    );
+    logger.debug("Stamped knowledge graph write", {
+      user: event.params.userEmail,
+      kgId: event.params.kgId,
+    });
+  },
+);